@@ -1,7 +1,8 @@
 import pandas as pd
 import numpy as np
-import random
 import configparser
+from src import datastore, dedup, splits
+from src.dataset import split_timesteps
 
 # reading config file and accessing variables
 config = configparser.ConfigParser()
@@ -9,32 +10,47 @@ try:
     config.read(r"config/config.ini")
     X_CRUCIFORM = config.get("Files", "x_compiled")
     Y_CRUCIFORM = config.get("Files", "y_compiled")
-    X_TRAIN = config.get("Files", "x_train")
-    Y_TRAIN = config.get("Files", "y_train")
-    X_TEST = config.get("Files", "x_test")
-    Y_TEST = config.get("Files", "y_test")
+    X_DATA = config.get("Files", "x_data")
+    Y_DATA = config.get("Files", "y_data")
 except Exception as e:
     print(f"Error reading configuration file: {e}")
     exit(1)
 
+# rows read at once from the compiled data
+BLOCK_ROWS = 50
+
+def scan_rows(path: str, params: np.ndarray = None):
+    """
+    First pass over the dataset stored at `path`, reading `BLOCK_ROWS` rows at a
+    time. Returns the indices of the rows that are neither duplicated (by their
+    content keys or, with DoE deduplication, their DoE `params`, keeping the first
+    occurrence) nor hold NaN values, and a boolean array telling which of those
+    rows pass the force filter, i.e. the forces increased from timestep 19 to 20
+    on both axes.
+    """
+
+    keys = datastore.load_keys(path)
+    seen = dedup.Deduplicator()
+    kept, force_ok = [], []
+    row = 0
+    for block in datastore.iter_blocks(path, BLOCK_ROWS):
+        forces, _ = split_timesteps(block)
+        rows = slice(row, row + len(block))
+        new = seen.admit(keys[rows], None if params is None else params[rows])
+        valid = new & ~np.isnan(block).any(axis=1)
+        increased = (forces[:, -1, :] - forces[:, -2, :] > 0).all(axis=1)
+        kept.extend(np.nonzero(valid)[0] + row)
+        force_ok.extend(increased[valid])
+        row += len(block)
+
+    return np.array(kept, dtype=np.int64), np.array(force_ok, dtype=bool)
+
 def main():
     """
     Main function to start code execution.
     """
 
     try:
-        # import X file
-        X = pd.read_csv(X_CRUCIFORM, header=None)
-
-        # removes duplicated lines
-        X.drop_duplicates(inplace=True)
-
-        # removes lines with NULL
-        X.dropna(inplace=True)
-
-        # removes column 1
-        # X = X.iloc[:, 1:]
-
         # import Y file
         y = pd.read_csv(Y_CRUCIFORM, sep=",")
 
@@ -42,74 +58,47 @@ def main():
         colunas_selecionadas = [coluna for coluna in y.columns if not coluna.startswith('Unnamed')]
         colunas_sem_nan = [coluna for coluna in colunas_selecionadas if not y[coluna].isnull().all()]
         y = y[colunas_sem_nan]
-        # y=y.loc[X.index]
-
-        # get number of columns and points
-        n_cols = len(X.columns)
-        points = int((n_cols/20-2)/3)
-
-        # put columns into X
-        l=[]
-        for x in range(1,21):
-            l.append("Force_x_"+str(x))
-            l.append("Force_y_"+str(x))
-            for p in range(1, points+1): # number of elements
-                l.append("Strain_x_"+str(p)+"_"+str(x))
-                l.append("Strain_y_"+str(p)+"_"+str(x))
-                l.append("Strain_xy_"+str(p)+"_"+str(x))
-        X.columns = l
-
-        X=X.reset_index(drop=True)
-        y=y.reset_index(drop=True)
 
-        # filter to ignore tests in which the force decreased from timestep 19 to 20
-        index1=X[(X["Force_y_20"]-X["Force_y_19"]>0) & (X["Force_x_20"]-X["Force_x_19"]>0)].index
-        index1
+        # first pass: rows without duplicates or NULL, and forces used by the filter
+        params = y.to_numpy(dtype=float) if dedup.DOE else None
+        kept, force_ok = scan_rows(X_CRUCIFORM, params)
 
-        # apply filter to original dataframe to extract good simulations
-        X=X.iloc[index1]
-        y=y.iloc[index1]
+        # order candidate rows by content key, so the seeded selection and splits only
+        # depend on which simulations were compiled, not on their row order (which
+        # changes when incremental compiles append new files)
+        keys = datastore.load_keys(X_CRUCIFORM)[kept]
+        order = np.lexsort(keys.T[::-1])
+        kept, force_ok = kept[order], force_ok[order]
 
-        # replace the first row in X with a numeric header from 1 to number of columns
-        X.columns = list(range(X.shape[1]))
+        # filter to ignore tests in which the force decreased from timestep 19 to 20
+        index1 = np.nonzero(force_ok)[0]
 
         # set a random seed for reproducibility
         random_state = 42
         np.random.seed(random_state)
 
         # calculate number of rows to delete (to get a "round number")
-        rows_to_delete = len(X) - 2260
+        rows_to_delete = len(index1) - 2260
 
         # randomly choose the indices to delete
-        indices_to_delete = np.random.choice(X.index, size=rows_to_delete, replace=False)
-
-        # drop the selected indices from both X and y
-        X_reduced = X.drop(indices_to_delete)
-        y_reduced = y.drop(indices_to_delete)
-
-        X = X_reduced
-        y = y_reduced
+        indices_to_delete = np.random.choice(index1, size=rows_to_delete, replace=False)
 
-        X=X.reset_index(drop=True)
-        y=y.reset_index(drop=True)
+        # drop the selected indices, keeping rows of the compiled data
+        rows = kept[index1[~np.isin(index1, indices_to_delete)]]
 
-        # separate data for train and test
-        r = random.sample(range(0, len(X)), 260) # define number of simulations to test
-        X_test = X.loc[r]
-        y_test = y.loc[r]
-        X_train = X.drop(r)
-        y_train = y.drop(r)
+        # seeded train/test splits, as row indices of the cleaned data
+        data_splits = splits.make_splits(len(rows))
 
     except Exception as e:
         print(f"Error filtering x and y cruciform data: {e}")
         return 1
 
-    # save data to csv
+    # second pass: stream selected rows of x data to a dataset, y data to csv,
+    # and save splits over them
     try:
-        X_train.to_csv(X_TRAIN, index=False)
-        y_train.to_csv(Y_TRAIN, index=False)
-        X_test.to_csv(X_TEST, index=False)
-        y_test.to_csv(Y_TEST, index=False)
+        datastore.take(X_CRUCIFORM, X_DATA, rows, BLOCK_ROWS)
+        y.iloc[rows].to_csv(Y_DATA, index=False)
+        splits.save_splits(data_splits, len(rows))
     except Exception as e:
         print(f"Error saving x and y cruciform data: {e}")
         return 1
@@ -117,4 +106,4 @@ def main():
     return 0
 
 if __name__ == "__main__":
-    exit(main())
\ No newline at end of file
+    exit(main())
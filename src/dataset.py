@@ -0,0 +1,86 @@
+import numpy as np
+from typing import List, NamedTuple, Tuple
+from numpy.typing import NDArray
+from src import datastore
+from src.datastore import N_TIMESTEPS, FORCES, COMPONENTS
+
+class SimulationData(NamedTuple):
+    """
+    Memory-mapped views of a simulation dataset. `data` holds one simulation per
+    row, `force[sim, t, axis]` and `strain[sim, t, point, comp]` index the same
+    memory, so slicing them only reads the selected values from disk.
+    """
+    data: NDArray[np.float64]
+    force: NDArray[np.float64]
+    strain: NDArray[np.float64]
+    n_points: int
+    schema: dict
+
+    def __len__(self) -> int:
+        return len(self.data)
+
+def split_timesteps(rows: NDArray[np.float64]) -> Tuple[NDArray[np.float64], NDArray[np.float64]]:
+    """
+    Splits (`n_sims`, 20x(2+3x`n_points`)) array `rows` of simulation data into
+    (`n_sims`, 20, 2) forces and (`n_sims`, 20, `n_points`, 3) strains views,
+    without copying.
+    """
+
+    n_sims = rows.shape[0]
+    steps = rows.reshape(n_sims, N_TIMESTEPS, -1)
+    n_points = (steps.shape[2] - len(FORCES)) // len(COMPONENTS)
+
+    forces = steps[:, :, :len(FORCES)]
+    strains = steps[:, :, len(FORCES):].reshape(n_sims, N_TIMESTEPS, n_points, len(COMPONENTS))
+
+    return forces, strains
+
+def join_timesteps(forces: NDArray[np.float64], strains: NDArray[np.float64]) -> NDArray[np.float64]:
+    """
+    Inverse of `split_timesteps`, joining `forces` and `strains` arrays back into
+    a (`n_sims`, 20x(2+3x`n_points`)) array with one simulation per row.
+    """
+
+    n_sims = strains.shape[0]
+    steps = np.concatenate([forces, strains.reshape(n_sims, N_TIMESTEPS, -1)], axis=2)
+
+    return steps.reshape(n_sims, -1)
+
+def open_dataset(path: str, rows: NDArray[np.int64] = None) -> SimulationData:
+    """
+    Opens the dataset stored at `path` as lazily loaded, memory-mapped views. If
+    `rows` indices are given (e.g. a train or test split), only those rows are
+    read, in that order.
+    """
+
+    data = datastore.load(path)
+    if rows is not None:
+        data = data[np.asarray(rows)]
+    force, strain = split_timesteps(data)
+    schema = datastore.read_schema(path)
+
+    return SimulationData(data, force, strain, schema["n_points"], schema)
+
+def feature_names(n_points: int) -> List[str]:
+    """
+    Returns column names of simulation rows with `n_points` points, i.e.
+    `Force_x_{t}`, `Force_y_{t}` and `Strain_{comp}_{point}_{t}` for each timestep.
+    """
+
+    names = []
+    for t in range(1, N_TIMESTEPS + 1):  # each timestep
+        names.extend(f"Force_{axis}_{t}" for axis in FORCES)
+        for p in range(1, n_points + 1):  # elements number
+            names.extend(f"Strain_{comp}_{p}_{t}" for comp in COMPONENTS)
+
+    return names
+
+def column_timesteps(n_points: int) -> NDArray[np.int64]:
+    """
+    Returns the timestep (1 to 20) of every column of simulation rows with
+    `n_points` points, in the order of `feature_names`.
+    """
+
+    per_step = len(FORCES) + len(COMPONENTS) * n_points
+
+    return np.repeat(np.arange(1, N_TIMESTEPS + 1), per_step)
@@ -0,0 +1,382 @@
+import numpy as np
+import configparser
+import hashlib
+import json
+import os
+import pandas as pd
+from typing import Iterator, Optional, Tuple
+from numpy.typing import NDArray
+
+# reading config file and accessing variables
+config = configparser.ConfigParser()
+try:
+    config.read(r"config/config.ini")
+    DTYPE = config.get("Data", "dtype", fallback="float64")
+except Exception as e:
+    print(f"Error reading configuration file: {e}")
+    exit(1)
+
+# simulation data layout: for each timestep, forces followed by strain
+# components of every point
+N_TIMESTEPS = 20
+FORCES = ["x", "y"]
+COMPONENTS = ["x", "y", "xy"]
+
+# size in bytes of row keys
+KEY_SIZE = 16
+
+def store_files(path: str) -> Tuple[str, str]:
+    """
+    Returns the data (.bin) and schema (.json) files of the dataset stored at
+    `path`. Any extension of `path` (e.g. .csv from config file) is ignored.
+    """
+
+    base = os.path.splitext(path)[0]
+
+    return f"{base}.bin", f"{base}.json"
+
+def keys_file(path: str) -> str:
+    """
+    Returns the row keys (.keys) file of the dataset stored at `path`.
+    """
+
+    return f"{os.path.splitext(path)[0]}.keys"
+
+def checkpoint_file(path: str) -> str:
+    """
+    Returns the checkpoint (.ckpt.json) file of the dataset stored at `path`.
+    """
+
+    return f"{os.path.splitext(path)[0]}.ckpt.json"
+
+def exists(path: str) -> bool:
+    """
+    Checks if there is a dataset stored at `path`.
+    """
+
+    return all(os.path.isfile(f) for f in store_files(path))
+
+def remove(path: str) -> None:
+    """
+    Removes the dataset stored at `path`, if any.
+    """
+
+    for f in store_files(path) + (keys_file(path), checkpoint_file(path)):
+        if os.path.isfile(f):
+            os.remove(f)
+
+def n_points_of(n_cols: int) -> int:
+    """
+    Returns the number of points of simulation rows with `n_cols` columns.
+    """
+
+    per_step = n_cols / N_TIMESTEPS - len(FORCES)
+    if n_cols % N_TIMESTEPS or per_step % len(COMPONENTS):
+        raise ValueError(f"{n_cols} columns don't match the simulation data layout")
+
+    return int(per_step // len(COMPONENTS))
+
+def create(path: str, n_points: int, dtype: str = None) -> dict:
+    """
+    Creates an empty dataset at `path` for simulations with `n_points` points,
+    replacing any previous one, and returns its schema.
+    """
+
+    bin_file, json_file = store_files(path)
+    schema = {
+        "dtype": np.dtype(dtype or DTYPE).name,
+        "n_timesteps": N_TIMESTEPS,
+        "n_points": n_points,
+        "forces": FORCES,
+        "components": COMPONENTS,
+        "n_cols": N_TIMESTEPS * (len(FORCES) + len(COMPONENTS) * n_points),
+    }
+
+    with open(json_file, "w") as f:
+        json.dump(schema, f, indent=2)
+    open(bin_file, "wb").close()
+    open(keys_file(path), "wb").close()
+
+    return schema
+
+def read_schema(path: str) -> dict:
+    """
+    Returns the schema of the dataset stored at `path`.
+    """
+
+    with open(store_files(path)[1], "r") as f:
+        return json.load(f)
+
+def n_rows(path: str) -> int:
+    """
+    Returns the number of complete rows of the dataset stored at `path`. A
+    partially written last row (e.g. after a crash) is not counted.
+    """
+
+    schema = read_schema(path)
+    row_bytes = schema["n_cols"] * np.dtype(schema["dtype"]).itemsize
+    rows = os.path.getsize(store_files(path)[0]) // row_bytes
+
+    # datasets written before row keys were introduced have no keys file
+    if os.path.isfile(keys_file(path)):
+        rows = min(rows, os.path.getsize(keys_file(path)) // KEY_SIZE)
+
+    return rows
+
+def row_keys(rows: NDArray[np.float64]) -> NDArray[np.uint8]:
+    """
+    Returns a (`n`, `KEY_SIZE`) array with a hash of the float64 values of each
+    row of (`n`, `n_cols`) array `rows`, identifying each simulation.
+    """
+
+    rows = np.ascontiguousarray(rows, dtype=np.float64)
+    keys = np.empty((len(rows), KEY_SIZE), dtype=np.uint8)
+    for i, row in enumerate(rows):
+        keys[i] = np.frombuffer(hashlib.blake2b(row.tobytes(), digest_size=KEY_SIZE).digest(), np.uint8)
+
+    return keys
+
+def append(path: str, rows: NDArray[np.float64], keys: NDArray[np.uint8] = None, sync: bool = False) -> None:
+    """
+    Appends (`n`, `n_cols`) array `rows` to the dataset stored at `path`, with
+    their `keys` identifying the simulation each row comes from (defaults to the
+    `row_keys` of `rows`). If `sync`, rows are flushed to disk before returning.
+    """
+
+    schema = read_schema(path)
+    rows = np.ascontiguousarray(rows, dtype=schema["dtype"])
+    if rows.ndim != 2 or rows.shape[1] != schema["n_cols"]:
+        raise ValueError(f"Rows of shape {rows.shape} don't match {schema['n_cols']} columns")
+    if keys is None:
+        keys = row_keys(rows)
+
+    # datasets written before row keys were introduced get keys for their rows first
+    if not os.path.isfile(keys_file(path)):
+        load_keys(path).tofile(keys_file(path))
+
+    # keys are written first, so every complete row has its key
+    for fname, values in ((keys_file(path), keys), (store_files(path)[0], rows)):
+        with open(fname, "ab") as f:
+            np.ascontiguousarray(values).tofile(f)
+            if sync:
+                f.flush()
+                os.fsync(f.fileno())
+
+def load_keys(path: str) -> NDArray[np.uint8]:
+    """
+    Returns the (`n_rows`, `KEY_SIZE`) keys of the rows of the dataset stored at
+    `path`. Keys of datasets without a keys file are computed from their rows.
+    """
+
+    if not os.path.isfile(keys_file(path)):
+        return np.concatenate(
+            [row_keys(block) for block in iter_blocks(path, 100)]
+            or [np.empty((0, KEY_SIZE), dtype=np.uint8)]
+        )
+
+    keys = np.fromfile(keys_file(path), dtype=np.uint8)
+
+    return keys[:n_rows(path) * KEY_SIZE].reshape(-1, KEY_SIZE)
+
+def truncate(path: str, rows: int) -> None:
+    """
+    Truncates the dataset stored at `path` to its first `rows` rows.
+    """
+
+    schema = read_schema(path)
+    row_bytes = schema["n_cols"] * np.dtype(schema["dtype"]).itemsize
+    os.truncate(store_files(path)[0], rows * row_bytes)
+    if os.path.isfile(keys_file(path)):
+        os.truncate(keys_file(path), rows * KEY_SIZE)
+
+def allocate(path: str, n_points: int, rows: int, dtype: str = None) -> dict:
+    """
+    Creates a dataset at `path` like `create`, with room for `rows` rows to be
+    filled by `write_rows` (e.g. by parallel workers), and returns its schema.
+    """
+
+    schema = create(path, n_points, dtype)
+    extend(path, rows)
+
+    return schema
+
+def extend(path: str, rows: int) -> int:
+    """
+    Adds room for `rows` rows at the end of the dataset stored at `path`, to be
+    filled by `write_rows`, and returns the index of the first one.
+    """
+
+    schema = read_schema(path)
+    row_bytes = schema["n_cols"] * np.dtype(schema["dtype"]).itemsize
+    start = n_rows(path)
+    os.truncate(store_files(path)[0], (start + rows) * row_bytes)
+    os.truncate(keys_file(path), (start + rows) * KEY_SIZE)
+
+    return start
+
+def write_rows(path: str, start: int, rows: NDArray[np.float64], keys: NDArray[np.uint8] = None) -> None:
+    """
+    Writes (`n`, `n_cols`) array `rows` and their `keys` (defaults to the
+    `row_keys` of `rows`) in place, from row `start` of the dataset stored at
+    `path`, which must already hold those rows (see `allocate`).
+    """
+
+    schema = read_schema(path)
+    rows = np.ascontiguousarray(rows, dtype=schema["dtype"])
+    row_bytes = schema["n_cols"] * np.dtype(schema["dtype"]).itemsize
+    if keys is None:
+        keys = row_keys(rows)
+    if start + len(rows) > n_rows(path):
+        raise ValueError(f"Rows {start} to {start + len(rows)} exceed dataset {path}")
+
+    for fname, values, width in ((store_files(path)[0], rows, row_bytes), (keys_file(path), keys, KEY_SIZE)):
+        with open(fname, "r+b") as f:
+            f.seek(start * width)
+            np.ascontiguousarray(values).tofile(f)
+
+def compact(path: str, keep: NDArray[np.bool_], block_size: int = 100) -> int:
+    """
+    Removes in place the rows of the dataset stored at `path` where `keep` is
+    False, moving the kept rows down in blocks of `block_size` rows. Returns
+    the number of kept rows.
+    """
+
+    keep = np.asarray(keep, dtype=bool)
+    kept = np.nonzero(keep)[0]
+
+    # kept rows only move to lower positions, so they are never overwritten before being read
+    first = int(np.argmin(keep)) if not keep.all() else len(keep)
+    data = load(path)
+    keys = load_keys(path)
+    for i in range(first, len(kept), block_size):
+        idx = kept[i:i + block_size]
+        write_rows(path, i, np.array(data[idx]), keys[idx])
+    del data
+    truncate(path, len(kept))
+
+    return len(kept)
+
+def move(src: str, dst: str) -> None:
+    """
+    Replaces the dataset stored at `dst` with the one stored at `src`.
+    """
+
+    remove(dst)
+    for src_file, dst_file in zip(store_files(src) + (keys_file(src),), store_files(dst) + (keys_file(dst),)):
+        os.replace(src_file, dst_file)
+
+def write(path: str, rows: NDArray[np.float64], dtype: str = None) -> None:
+    """
+    Writes (`n`, `n_cols`) array `rows` of simulation data to a new dataset at
+    `path`.
+    """
+
+    create(path, n_points_of(np.shape(rows)[1]), dtype)
+    append(path, rows)
+
+def take(path: str, dst: str, indices: NDArray[np.int64], block_size: int = 100, dtype: str = None) -> int:
+    """
+    Writes rows `indices` of the dataset stored at `path`, in that order, to a new
+    dataset at `dst`, reading `block_size` rows at a time. Returns the number of
+    written rows.
+    """
+
+    create(dst, read_schema(path)["n_points"], dtype)
+    for block in iter_rows(path, indices, block_size):
+        append(dst, block)
+
+    return len(indices)
+
+def load(path: str) -> NDArray[np.float64]:
+    """
+    Returns a read-only (`n_rows`, `n_cols`) memory-mapped array of the dataset
+    stored at `path`. Data is only read from disk when accessed.
+    """
+
+    schema = read_schema(path)
+    shape = (n_rows(path), schema["n_cols"])
+    if shape[0] == 0:
+        return np.empty(shape, dtype=schema["dtype"])
+
+    return np.memmap(store_files(path)[0], dtype=schema["dtype"], mode="r", shape=shape)
+
+def iter_blocks(path: str, block_size: int, start: int = 0) -> Iterator[NDArray[np.float64]]:
+    """
+    Yields blocks of up to `block_size` rows of the dataset stored at `path`,
+    from row `start` on, as in-memory float64 arrays.
+    """
+
+    data = load(path)
+    for i in range(start, len(data), block_size):
+        yield np.asarray(data[i:i + block_size], dtype=np.float64)
+
+def iter_rows(path: str, indices: NDArray[np.int64], block_size: int) -> Iterator[NDArray[np.float64]]:
+    """
+    Yields rows `indices` of the dataset stored at `path`, in that order, in
+    blocks of up to `block_size` rows, as in-memory float64 arrays. Only the
+    selected rows are read from disk.
+    """
+
+    data = load(path)
+    for i in range(0, len(indices), block_size):
+        yield np.asarray(data[np.asarray(indices[i:i + block_size])], dtype=np.float64)
+
+def fingerprint(path: str) -> dict:
+    """
+    Returns a cheap fingerprint of the dataset stored at `path` (schema, size and
+    modification time), which changes whenever the dataset is rewritten.
+    """
+
+    st = os.stat(store_files(path)[0])
+
+    return {"schema": read_schema(path), "size": st.st_size, "mtime_ns": st.st_mtime_ns}
+
+def read_checkpoint(path: str) -> Optional[dict]:
+    """
+    Returns the checkpoint saved for the dataset stored at `path`, or None.
+    """
+
+    try:
+        with open(checkpoint_file(path), "r") as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+def write_checkpoint(path: str, state: dict) -> None:
+    """
+    Atomically saves checkpoint `state` for the dataset stored at `path`.
+    """
+
+    ckpt = checkpoint_file(path)
+    with open(f"{ckpt}.tmp", "w") as f:
+        json.dump(state, f)
+    os.replace(f"{ckpt}.tmp", ckpt)
+
+def convert_csv(csv_file: str, path: str = None, block_size: int = 100) -> int:
+    """
+    Converts wide simulation data file `csv_file` to a dataset at `path` (defaults
+    to the same path with the dataset extensions), streaming `block_size` rows at a
+    time. A pandas numeric header (0, 1, 2...) is detected and skipped. Returns the
+    number of converted rows.
+    """
+
+    if path is None:
+        path = csv_file
+
+    # detect header row
+    with open(csv_file, "r") as f:
+        first = f.readline().strip().split(",")
+    try:
+        values = np.array(first, dtype=float)
+        header = bool(np.array_equal(values, np.arange(len(values))))
+    except ValueError:
+        header = True
+
+    create(path, n_points_of(len(first)))
+    total = 0
+    reader = pd.read_csv(csv_file, header=0 if header else None, chunksize=block_size, float_precision="round_trip")
+    for block in reader:
+        append(path, block.to_numpy(dtype=float))
+        total += len(block)
+
+    return total
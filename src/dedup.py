@@ -0,0 +1,130 @@
+import numpy as np
+import configparser
+import hashlib
+import os
+from typing import Optional, Sequence
+from numpy.typing import NDArray
+from src.datastore import KEY_SIZE
+
+# reading config file and accessing variables
+config = configparser.ConfigParser()
+try:
+    config.read(r"config/config.ini")
+    DOE = config.getboolean("Dedup", "doe", fallback=False)
+except Exception as e:
+    print(f"Error reading configuration file: {e}")
+    exit(1)
+
+def index_file(path: str, kind: str) -> str:
+    """
+    Returns the file of the `kind` ("content" or "doe") hash index kept for the
+    dataset stored at `path`.
+    """
+
+    return f"{os.path.splitext(path)[0]}.{kind}.seen"
+
+def doe_key(params: Sequence[float]) -> bytes:
+    """
+    Returns a `KEY_SIZE` bytes hash of the DoE parameter tuple `params` of a
+    simulation.
+    """
+
+    values = np.ascontiguousarray(params, dtype=np.float64)
+
+    return hashlib.blake2b(values.tobytes(), digest_size=KEY_SIZE).digest()
+
+class HashIndex:
+    """
+    Set of `KEY_SIZE` bytes hashes, persisted as an append-only file at `path` (kept
+    in memory only if `path` is None), so hashes seen by previous runs are known.
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path
+        self.seen = set()
+        if path is not None and os.path.isfile(path):
+            keys = np.fromfile(path, dtype=np.uint8)
+            keys = keys[:len(keys) // KEY_SIZE * KEY_SIZE].reshape(-1, KEY_SIZE)
+            self.seen = {key.tobytes() for key in keys}
+
+    def __contains__(self, key: bytes) -> bool:
+        return key in self.seen
+
+    def __len__(self) -> int:
+        return len(self.seen)
+
+    def add(self, keys: Sequence[bytes]) -> None:
+        """
+        Adds `keys` to the index, saving the new ones to its file.
+        """
+
+        new = [key for key in dict.fromkeys(keys) if key not in self.seen]
+        self.seen.update(new)
+        if self.path is not None and new:
+            with open(self.path, "ab") as f:
+                f.write(b"".join(new))
+
+    def clear(self) -> None:
+        """
+        Removes every hash from the index and its file.
+        """
+
+        self.seen = set()
+        if self.path is not None and os.path.isfile(self.path):
+            os.remove(self.path)
+
+class Deduplicator:
+    """
+    Streaming deduplication of simulations by the hash of their raw values and,
+    if `doe` (defaults to `DOE`), by the hash of their DoE parameter tuple. Seen
+    hashes are kept in indexes next to the dataset stored at `path`, so rows added
+    by later runs are also checked against earlier ones (in memory only if `path`
+    is None).
+    """
+
+    def __init__(self, path: Optional[str] = None, doe: bool = None):
+        if doe is None:
+            doe = DOE
+        self.content = HashIndex(None if path is None else index_file(path, "content"))
+        self.doe = HashIndex(None if path is None else index_file(path, "doe")) if doe else None
+
+    def admit(self, keys: NDArray[np.uint8], params: NDArray[np.float64] = None) -> NDArray[np.bool_]:
+        """
+        Returns which rows of a block are new, given their (`n`, `KEY_SIZE`) content
+        `keys` (see `datastore.row_keys`) and, for DoE deduplication, their (`n`, `p`)
+        DoE `params`. New rows are added to the indexes, so later duplicates,
+        including those within the block, are rejected.
+        """
+
+        if self.doe is not None and params is None:
+            raise ValueError("DoE parameters are needed for DoE deduplication")
+
+        new = np.zeros(len(keys), dtype=bool)
+        added, added_doe = {}, {}
+        for i, key in enumerate(keys):
+            key = key.tobytes()
+            pkey = doe_key(params[i]) if self.doe is not None else None
+            if key in self.content or key in added:
+                continue
+            if pkey is not None and (pkey in self.doe or pkey in added_doe):
+                continue
+            added[key] = None
+            if pkey is not None:
+                added_doe[pkey] = None
+            new[i] = True
+
+        # save new hashes of the block at once
+        self.content.add(list(added))
+        if self.doe is not None:
+            self.doe.add(list(added_doe))
+
+        return new
+
+    def clear(self) -> None:
+        """
+        Forgets every seen row.
+        """
+
+        self.content.clear()
+        if self.doe is not None:
+            self.doe.clear()
@@ -0,0 +1,88 @@
+import configparser
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Any, Callable, Iterable, Optional
+from threadpoolctl import threadpool_limits
+
+# reading config file and accessing variables
+config = configparser.ConfigParser()
+try:
+    config.read(r"config/config.ini")
+    WORKERS = config.getint("Parallel", "workers", fallback=1)
+    BLAS_THREADS = config.getint("Parallel", "blas_threads", fallback=1)
+except Exception as e:
+    print(f"Error reading configuration file: {e}")
+    exit(1)
+
+# environment variables read by BLAS/OpenMP libraries when they start
+THREAD_VARS = [
+    "OMP_NUM_THREADS",
+    "OPENBLAS_NUM_THREADS",
+    "MKL_NUM_THREADS",
+    "BLIS_NUM_THREADS",
+    "VECLIB_MAXIMUM_THREADS",
+    "NUMEXPR_NUM_THREADS",
+]
+
+_limits = None
+
+def _init_worker(blas_threads: int) -> None:
+    """
+    Limits BLAS/OpenMP thread pools of a worker process to `blas_threads` threads.
+    """
+
+    global _limits
+    for var in THREAD_VARS:
+        os.environ[var] = str(blas_threads)
+    _limits = threadpool_limits(limits=blas_threads)
+
+def run_jobs(
+        func: Callable,
+        jobs: Iterable[tuple],
+        on_result: Callable[[tuple, Any], Optional[bool]],
+        workers: int = None,
+        blas_threads: int = None
+    ) -> bool:
+    """
+    Runs `func(*job)` for every job of `jobs` in a pool of `workers` processes,
+    each one limited to `blas_threads` BLAS threads (defaults from config file).
+    `on_result(job, result)` is called in the calling process as jobs complete,
+    in completion order, so it can safely write shared files. Returns False, and
+    cancels pending jobs, as soon as a job returns None or `on_result` returns False.
+    """
+
+    if workers is None:
+        workers = WORKERS
+    if blas_threads is None:
+        blas_threads = BLAS_THREADS
+    jobs = list(jobs)
+
+    # run in this process when no pool is needed
+    if workers <= 1 or len(jobs) <= 1:
+        for job in jobs:
+            result = func(*job)
+            if result is None or on_result(job, result) is False:
+                return False
+        return True
+
+    # spawned workers don't inherit BLAS thread pools started by this process
+    ctx = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(
+        max_workers=min(workers, len(jobs)),
+        mp_context=ctx,
+        initializer=_init_worker,
+        initargs=(blas_threads,)
+    ) as pool:
+        futures = {pool.submit(func, *job): job for job in jobs}
+        for future in as_completed(futures):
+            try:
+                result = future.result()
+            except Exception as e:
+                print(f"Error running job in worker process: {e}")
+                result = None
+            if result is None or on_result(futures[future], result) is False:
+                pool.shutdown(wait=True, cancel_futures=True)
+                return False
+
+    return True
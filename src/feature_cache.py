@@ -0,0 +1,118 @@
+import numpy as np
+import pandas as pd
+import configparser
+import hashlib
+import joblib
+import json
+import os
+from typing import Iterable, Optional, Tuple
+from numpy.typing import NDArray
+from sklearn.preprocessing import StandardScaler
+from src import file_cache
+
+# reading config file and accessing variables
+config = configparser.ConfigParser()
+try:
+    config.read(r"config/config.ini")
+    CACHE = config.get("Paths", "cache")
+    MAX_SIZE_MB = config.getfloat("Cache", "features_max_size_mb", fallback=8192)
+except Exception as e:
+    print(f"Error reading configuration file: {e}")
+    exit(1)
+
+FEATURES = os.path.join(CACHE, "features")
+
+def feature_key(**params) -> str:
+    """
+    Returns the cache key of training features built with the given `params`
+    (grid size, method, fingerprints of the datasets and rows they come from...).
+    """
+
+    meta = json.dumps(params, sort_keys=True)
+
+    return hashlib.sha256(meta.encode()).hexdigest()
+
+def entry_dir(key: str) -> str:
+    return os.path.join(FEATURES, key)
+
+def _discard(path: str) -> None:
+    print(f"Discarding invalid cached features {path}")
+    file_cache.remove(path)
+
+def load_features(key: str) -> Optional[Tuple[NDArray[np.float32], pd.DataFrame, StandardScaler]]:
+    """
+    Returns the scaled features (memory-mapped), targets and fitted scaler stored
+    under `key`. Returns None if there is no entry, or if it fails the integrity
+    checks, in which case the entry is removed.
+    """
+
+    path = entry_dir(key)
+    if not os.path.isdir(path):
+        return None
+
+    try:
+        with open(os.path.join(path, "meta.json"), "r") as f:
+            meta = json.load(f)
+        X = np.load(os.path.join(path, "features.npy"), mmap_mode="r")
+        y = pd.DataFrame(np.load(os.path.join(path, "targets.npy")), columns=meta["columns"])
+        scaler = joblib.load(os.path.join(path, "scaler.joblib"))
+        valid = meta["key"] == key and list(X.shape) == meta["shape"] and len(y) == len(X)
+    except Exception as e:
+        print(f"Error reading cached features {path}: {e}")
+        valid = False
+
+    if not valid:
+        _discard(path)
+        return None
+
+    file_cache.touch(path)
+
+    return X, y, scaler
+
+def save_features(key: str, chunks: Iterable[NDArray[np.float32]], y: pd.DataFrame, scaler: StandardScaler) -> None:
+    """
+    Saves scaled features, given as `chunks` of consecutive rows (written one at a
+    time, so they can be streamed), targets `y` and the `scaler` fitted on them
+    under `key`, then evicts the least recently used entries until the cache fits
+    in `MAX_SIZE_MB`.
+    """
+
+    os.makedirs(FEATURES, exist_ok=True)
+    path = entry_dir(key)
+    tmp_path = file_cache.tmp_path(path)
+
+    # write to a temporary folder first so a crash never leaves a partial entry
+    file_cache.remove(tmp_path)
+    os.makedirs(tmp_path)
+    X = np.lib.format.open_memmap(
+        os.path.join(tmp_path, "features.npy"), mode="w+", dtype=np.float32, shape=(len(y), scaler.n_features_in_)
+    )
+    start = 0
+    for chunk in chunks:
+        X[start:start + len(chunk)] = chunk
+        start += len(chunk)
+    if start != len(y):
+        raise ValueError(f"Got {start} rows of features for {len(y)} targets")
+    X.flush()
+    shape = list(X.shape)
+    del X
+    np.save(os.path.join(tmp_path, "targets.npy"), y.to_numpy(dtype=np.float64))
+    joblib.dump(scaler, os.path.join(tmp_path, "scaler.joblib"))
+    with open(os.path.join(tmp_path, "meta.json"), "w") as f:
+        json.dump({"key": key, "shape": shape, "columns": list(y.columns)}, f)
+    file_cache.commit(tmp_path, path)
+
+    evict(keep=key)
+
+def evict(max_size_mb: float = None, keep: str = None) -> None:
+    """
+    Removes files left by crashed processes (partial entries, external memory
+    pages), then least recently used entries, except `keep`, until the total size
+    of cached features is below `max_size_mb` (defaults to `MAX_SIZE_MB`).
+    """
+
+    if max_size_mb is None:
+        max_size_mb = MAX_SIZE_MB
+
+    if os.path.isdir(FEATURES):
+        file_cache.evict(FEATURES, max_size_mb, keep=None if keep is None else entry_dir(keep))
@@ -0,0 +1,105 @@
+import os
+import re
+import shutil
+
+# temporary files and folders are named `<entry>.<pid>.tmp...` after the process writing them
+TMP_PATTERN = re.compile(r"\.(\d+)\.tmp")
+
+def tmp_path(path: str, suffix: str = "") -> str:
+    """
+    Returns the temporary path an entry at `path` is written to by this process
+    before it is committed, keeping the extension `suffix`.
+    """
+
+    return f"{path}.{os.getpid()}.tmp{suffix}"
+
+def commit(tmp: str, path: str) -> None:
+    """
+    Atomically replaces the entry at `path` (a file or a folder) with the one
+    written at `tmp`, so a crash never leaves a partial entry.
+    """
+
+    if os.path.isdir(path):
+        shutil.rmtree(path, ignore_errors=True)
+    os.replace(tmp, path)
+
+def remove(path: str) -> None:
+    """
+    Removes the entry at `path` (a file or a folder), if it still exists.
+    """
+
+    if os.path.isdir(path):
+        shutil.rmtree(path, ignore_errors=True)
+    else:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+def touch(path: str) -> None:
+    """
+    Marks the entry at `path` as recently used for eviction.
+    """
+
+    try:
+        os.utime(path)
+    except FileNotFoundError:
+        pass
+
+def entry_size(path: str) -> int:
+    """
+    Returns the size in bytes of the entry at `path` (a file or a folder).
+    """
+
+    if os.path.isdir(path):
+        return sum(entry.stat().st_size for entry in os.scandir(path))
+
+    return os.stat(path).st_size
+
+def _running(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+
+    return True
+
+def purge_stale(folder: str) -> None:
+    """
+    Removes the temporary files and folders in `folder` left by processes that are
+    no longer running (e.g. after a crash).
+    """
+
+    for name in os.listdir(folder):
+        match = TMP_PATTERN.search(name)
+        if match and not _running(int(match.group(1))):
+            remove(os.path.join(folder, name))
+
+def evict(folder: str, max_size_mb: float, suffix: str = "", keep: str = None) -> None:
+    """
+    Removes stale temporary entries, then least recently used entries of `folder`
+    named `*<suffix>`, except `keep`, until their total size is below `max_size_mb`.
+    """
+
+    purge_stale(folder)
+
+    # entries may be removed concurrently by other worker processes
+    entries = []
+    for name in os.listdir(folder):
+        if not name.endswith(suffix) or TMP_PATTERN.search(name):
+            continue
+        path = os.path.join(folder, name)
+        try:
+            entries.append((os.stat(path).st_mtime, entry_size(path), path))
+        except FileNotFoundError:
+            continue
+
+    # oldest entries first, the kept one last
+    entries.sort(key=lambda entry: (entry[2] == keep, entry[:2]))
+    total = sum(size for _, size, _ in entries)
+    while entries and entries[0][2] != keep and total > max_size_mb * 1024**2:
+        _, size, path = entries.pop(0)
+        remove(path)
+        total -= size
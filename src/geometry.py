@@ -0,0 +1,61 @@
+import numpy as np
+from typing import Tuple
+from numpy.typing import NDArray
+from scipy.spatial import cKDTree
+
+def load_elements(path: str) -> NDArray[np.int64]:
+    """
+    Returns the (`n_elements`, `nodes_per_element`) connectivity of the mesh saved
+    at `path` (one row of 1-based node labels per element, as written by
+    `abaqus/extract_nodes.py`).
+    """
+
+    return np.loadtxt(path, delimiter=",", dtype=np.int64, ndmin=2)
+
+def load_nodes(path: str) -> NDArray[np.float64]:
+    """
+    Returns the (`n_frames`, `n_nodes`, 3) nodal coordinates saved at `path` (one
+    row of x,y,z values of every node per frame, as written by
+    `abaqus/extract_nodes.py`).
+    """
+
+    coords = np.loadtxt(path, delimiter=",", dtype=np.float64, ndmin=2)
+    if coords.shape[1] % 3:
+        raise ValueError(f"Rows of {path} don't hold x,y,z values of whole nodes")
+
+    return coords.reshape(len(coords), -1, 3)
+
+def element_centroids(elements: NDArray[np.int64], nodes: NDArray[np.float64]) -> NDArray[np.float64]:
+    """
+    Returns the centroids (mean of the nodal coordinates) of `elements`, which
+    is the integration point of reduced integration elements such as C3D8R.
+    `nodes` is either (`n_nodes`, 3), giving (`n_elements`, 3) centroids, or
+    (`n_frames`, `n_nodes`, 3), giving (`n_frames`, `n_elements`, 3) centroids
+    of the deformed mesh at every frame.
+    """
+
+    if elements.min() < 1 or elements.max() > nodes.shape[-2]:
+        raise ValueError(f"Elements refer to nodes outside 1..{nodes.shape[-2]}")
+
+    # gather (..., n_elements, nodes_per_element, 3) coordinates at once
+    return nodes[..., elements - 1, :].mean(axis=-2)
+
+def match_points(points: NDArray[np.float64], targets: NDArray[np.float64], tolerance: float) -> Tuple[NDArray[np.int64], NDArray[np.float64], NDArray[np.bool_]]:
+    """
+    Matches every row of `points` to its nearest row of `targets` (e.g. computed
+    integration points to Abaqus centroids), regardless of their order. Returns
+    the index of the nearest target and the distance to it for every point, and
+    which points are matched: those within `tolerance` of their nearest target,
+    which no other point is closer to.
+    """
+
+    dist, idx = cKDTree(targets).query(points, k=1)
+
+    # a target claimed by several points only matches the closest one
+    order = np.lexsort((dist, idx))
+    first = np.ones(len(order), dtype=bool)
+    first[1:] = idx[order][1:] != idx[order][:-1]
+    unique = np.zeros(len(points), dtype=bool)
+    unique[order[first]] = True
+
+    return idx, dist, unique & (dist <= tolerance)
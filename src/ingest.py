@@ -0,0 +1,111 @@
+import numpy as np
+import hashlib
+import json
+import os
+import re
+from typing import List, Optional, Tuple
+from numpy.typing import NDArray
+from src import datastore
+
+# DoE parameters of each simulation, in the order they appear in raw file names
+PARAMS = ["F", "G", "H", "L", "M", "N", "sigma0", "k", "n"]
+
+def doe_params(path: str) -> NDArray[np.float64]:
+    """
+    Returns the DoE parameters of the raw simulation file at `path`, parsed from
+    its file name (e.g. `0.142_0.562_..._0.767.csv`).
+    """
+
+    values = re.findall(r"\d+(?:\.\d+)?", os.path.basename(path))
+    if len(values) != len(PARAMS):
+        raise ValueError(f"Expected {len(PARAMS)} parameters in file name {path}")
+
+    return np.array(values, dtype=float)
+
+def is_simulation_file(path: str) -> bool:
+    """
+    Returns whether the file at `path` is named after the DoE parameters of a
+    simulation, unlike other csv files (e.g. mesh files) sharing the raw folder.
+    """
+
+    try:
+        doe_params(path)
+    except ValueError:
+        return False
+
+    return True
+
+def file_hash(path: str) -> str:
+    """
+    Returns a hash of the contents of the file at `path`.
+    """
+
+    h = hashlib.blake2b()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+
+    return h.hexdigest()
+
+def manifest_file(path: str) -> str:
+    """
+    Returns the manifest (.manifest.json) file of the dataset compiled at `path`.
+    """
+
+    return f"{os.path.splitext(path)[0]}.manifest.json"
+
+def load_manifest(path: str) -> Optional[List[dict]]:
+    """
+    Returns the manifest entries of the dataset compiled at `path`, in the order
+    the files were compiled, or None if there is no valid manifest. Each entry
+    holds the `path`, `size`, `mtime_ns` and content `hash` of a raw file, and
+    whether it was `compiled` into a row (False for rejected duplicates).
+    """
+
+    try:
+        with open(manifest_file(path), "r") as f:
+            return json.load(f)["files"]
+    except (FileNotFoundError, json.JSONDecodeError, KeyError):
+        return None
+
+def save_manifest(path: str, entries: List[dict]) -> None:
+    """
+    Atomically saves manifest `entries` of the dataset compiled at `path`.
+    """
+
+    manifest = manifest_file(path)
+    with open(f"{manifest}.tmp", "w") as f:
+        json.dump({"files": entries}, f, indent=1)
+    os.replace(f"{manifest}.tmp", manifest)
+
+def read_simulation(path: str, n_cols: int = None) -> NDArray[np.float64]:
+    """
+    Reads the raw simulation file at `path`, with one line of forces and strains
+    per timestep, into a single row. If `n_cols` is given, the row is cut or
+    padded with NaN (missing timesteps) to that many columns.
+    """
+
+    row = np.loadtxt(path, delimiter=",", ndmin=2).ravel()
+    if n_cols is None:
+        return row
+
+    padded = np.full(n_cols, np.nan)
+    padded[:min(len(row), n_cols)] = row[:n_cols]
+
+    return padded
+
+def ingest_files(paths: List[str], start: int, dst: str) -> Optional[List[Tuple[NDArray[np.float64], str]]]:
+    """
+    Reads raw simulation files `paths` and writes them as rows `start` onwards of
+    the dataset allocated at `dst`. Returns the DoE parameters and content hash
+    of every file, or None if any file can't be read.
+    """
+
+    try:
+        n_cols = datastore.read_schema(dst)["n_cols"]
+        rows = np.array([read_simulation(path, n_cols) for path in paths])
+        datastore.write_rows(dst, start, rows)
+        return [(doe_params(path), file_hash(path)) for path in paths]
+    except Exception as e:
+        print(f"Error ingesting raw files from {paths[0]}: {e}")
+        return None
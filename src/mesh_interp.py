@@ -4,9 +4,13 @@ import configparser
 import os
 import time
 import pandas as pd
-from typing import Tuple
+from typing import List, Tuple
 from numpy.typing import NDArray
-from scipy.interpolate import Rbf
+from scipy import sparse
+from src.rbf_operator import rbf_operator, rbf_operators, local_rbf_operator, rbf_epsilon, apply_operator
+from src.executor import run_jobs
+from src import datastore, operator_cache
+from src.dataset import split_timesteps, join_timesteps
 
 # reading config file and accessing variables
 config = configparser.ConfigParser()
@@ -14,15 +18,17 @@ try:
     config.read(r"config/config.ini")
     DATA = config.get("Paths", "data_cleaned")
     INT_P = config.get("Files", "centroids")
-    X_TRAIN = config.get("Files", "x_train")
-    X_TEST = config.get("Files", "x_test")
+    X_DATA = config.get("Files", "x_data")
     METRICS = config.get("Files", "interp_metrics")
+    NEIGHBOURS = config.getint("Interpolation", "neighbours", fallback=0)
+    RESUME = config.getboolean("Interpolation", "resume", fallback=False)
+    INCREMENTAL = config.getboolean("Interpolation", "incremental", fallback=False)
 except Exception as e:
     print(f"Error reading configuration file: {e}")
     exit(1)
 
 # setting global vars
-IN_FILES = [X_TRAIN, X_TEST]
+IN_FILES = [X_DATA]
 GRIDS = [20, 30, 40]
 METHODS = ["linear", "cubic", "multiquadric"]
 BUFF_TSHOLD = 100
@@ -72,11 +78,157 @@ def mesh_gen(n_points: int) -> Tuple[NDArray[np.float64], NDArray[np.float64]]:
     
     return x_coords, y_coords
 
-def interpolator(infile: str, grid: int, method: str, x: NDArray[np.float64], y: NDArray[np.float64]):
+def grid_operators(
+        grids: List[int],
+        method: str,
+        x: NDArray[np.float64],
+        y: NDArray[np.float64],
+        reverse: bool = False,
+        neighbours: int = None
+    ) -> List[Tuple[NDArray[np.float64] | sparse.csr_matrix, NDArray[np.float64], NDArray[np.float64]]]:
     """
-    Interpolates `infile` csv data file with a mesh grid of `grid`x`grid` points
-    using any `method` from `scipy.interpolate Rbf`. Integration points coordinates `x` and `y` must
-    be given.
+    Returns, for each grid size of `grids`, the operator that interpolates values
+    at centroids `x`, `y` onto the `grid`x`grid` mesh with any `method` from
+    `scipy.interpolate Rbf` (or from the mesh back onto the centroids if `reverse`),
+    together with the mesh `x` and `y` coordinates. If `neighbours` (defaults to
+    `NEIGHBOURS`) is positive, a sparse local RBF operator fitted on that many
+    nearest nodes is used instead of the global one. Operators are loaded from the
+    on-disk cache when available, and missing global forward operators share a
+    single factorization of the centroids kernel system.
+    """
+
+    if neighbours is None:
+        neighbours = NEIGHBOURS
+
+    cent_hash = operator_cache.centroids_hash(x, y)
+    ops = [None] * len(grids)
+    missing = []
+    for i, grid in enumerate(grids):
+        grid_x, grid_y = mesh_gen(grid)
+        if grid_x is None:
+            raise ValueError(f"Could not generate mesh grid {grid}")
+
+        # kernel parameters, with epsilon resolved from the interpolation nodes
+        nodes_x, nodes_y, eval_x, eval_y = (grid_x, grid_y, x, y) if reverse else (x, y, grid_x, grid_y)
+        epsilon = rbf_epsilon(nodes_x, nodes_y)
+        key = operator_cache.operator_key(
+            cent_hash, grid=grid, method=method, epsilon=epsilon, reverse=reverse,
+            neighbours=neighbours
+        )
+
+        # sparse operators are stored as their csr arrays
+        cached = operator_cache.load_operator(key, cent_hash)
+        if cached is not None and neighbours > 0:
+            data, indices, indptr, shape, grid_x, grid_y = cached
+            ops[i] = sparse.csr_matrix((data, indices, indptr), shape=tuple(shape)), grid_x, grid_y
+        elif cached is not None:
+            ops[i] = cached
+        else:
+            missing.append((i, key, nodes_x, nodes_y, eval_x, eval_y, epsilon))
+
+    # forward global operators only differ on evaluation points
+    if missing and neighbours <= 0 and not reverse:
+        shared = rbf_operators(x, y, [(m[4], m[5]) for m in missing], method, missing[0][6])
+    else:
+        shared = [None] * len(missing)
+
+    for (i, key, nodes_x, nodes_y, eval_x, eval_y, epsilon), op in zip(missing, shared):
+        grid_x, grid_y = (nodes_x, nodes_y) if reverse else (eval_x, eval_y)
+        if neighbours > 0:
+            op = local_rbf_operator(nodes_x, nodes_y, eval_x, eval_y, method, neighbours, epsilon)
+            operator_cache.save_operator(
+                key, cent_hash, op.data, op.indices, op.indptr, np.array(op.shape), grid_x, grid_y
+            )
+        else:
+            if op is None:
+                op = rbf_operator(nodes_x, nodes_y, eval_x, eval_y, method, epsilon)
+            operator_cache.save_operator(key, cent_hash, op, grid_x, grid_y)
+        ops[i] = op, grid_x, grid_y
+
+    return ops
+
+def grid_operator(
+        grid: int,
+        method: str,
+        x: NDArray[np.float64],
+        y: NDArray[np.float64],
+        reverse: bool = False,
+        neighbours: int = None
+    ) -> Tuple[NDArray[np.float64] | sparse.csr_matrix, NDArray[np.float64], NDArray[np.float64]]:
+    """
+    Returns the operator for a single `grid`, as described in `grid_operators`.
+    """
+
+    return grid_operators([grid], method, x, y, reverse, neighbours)[0]
+
+def round_trip_operator(
+        grid: int,
+        method: str,
+        x: NDArray[np.float64],
+        y: NDArray[np.float64],
+        neighbours: int = None
+    ) -> NDArray[np.float64] | sparse.csr_matrix:
+    """
+    Returns the (`n`,`n`) operator that interpolates values at the `n` centroids `x`,
+    `y` onto the `grid`x`grid` mesh and back onto the centroids, i.e. the product of
+    the reverse and forward operators from `grid_operator`. The product of local
+    (sparse) operators is kept sparse, so its cost grows with `n` times the number
+    of neighbours instead of `n` squared.
+    """
+
+    fwd_op, _, _ = grid_operator(grid, method, x, y, neighbours=neighbours)
+    inv_op, _, _ = grid_operator(grid, method, x, y, reverse=True, neighbours=neighbours)
+    op = inv_op @ fwd_op
+
+    return sparse.csr_matrix(op) if sparse.issparse(op) else np.asarray(op)
+
+def interpolate_batch(op: NDArray[np.float64], strains: NDArray[np.float64]) -> NDArray[np.float64]:
+    """
+    Interpolates a (`n_sims`, 20, `n_points`, 3) array of `strains` with operator
+    `op`, for all simulations, timesteps and strain components in one call.
+    Returns the result in the same layout, with NaN values replaced with 0.
+    """
+
+    return np.nan_to_num(apply_operator(op, strains))
+
+def reuse_rows(keys_in: NDArray[np.uint8], keys_out: NDArray[np.uint8]) -> NDArray[np.int64]:
+    """
+    Returns, for every input row key of `keys_in`, the index of the first output row
+    with the same key in `keys_out`, or -1 if the row hasn't been interpolated yet.
+    """
+
+    index = {}
+    for i, key in enumerate(keys_out):
+        index.setdefault(key.tobytes(), i)
+
+    return np.array([index.get(key.tobytes(), -1) for key in keys_in], dtype=np.int64)
+
+def appended_rows(reuse: NDArray[np.int64]) -> int:
+    """
+    Returns the number of leading input rows already stored in the same position of
+    an output, given its `reuse_rows`, if every other input row is new (i.e. the
+    output only needs to be truncated and appended to), or None otherwise.
+    """
+
+    in_place = reuse == np.arange(len(reuse))
+    prefix = len(reuse) if in_place.all() else int(np.argmin(in_place))
+
+    return prefix if (reuse[prefix:] < 0).all() else None
+
+def interpolator(infile: str, grids: List[int], method: str, x: NDArray[np.float64], y: NDArray[np.float64]):
+    """
+    Interpolates `infile` dataset with mesh grids of `grid`x`grid` points for every
+    grid size of `grids` in a single pass, using any `method` from `scipy.interpolate Rbf`.
+    Integration points coordinates `x` and `y` must be given. Returns one result per
+    grid, whose duration counts the work specific to that grid plus an equal share of
+    the shared work (reading input, common factorization).
+    If `RESUME`, outputs are checkpointed after every block: a previous run on the
+    same input and parameters continues from its last flushed row, and is skipped
+    entirely if it had completed.
+    If `INCREMENTAL`, output rows are matched to input rows by their keys, so after
+    the input changes only new simulations are interpolated: they are appended when
+    the previous input is a prefix of the new one, otherwise outputs are rebuilt in
+    input order copying the rows already interpolated.
     """
 
     # start timer
@@ -85,88 +237,135 @@ def interpolator(infile: str, grid: int, method: str, x: NDArray[np.float64], y:
     # extract the base name (without extension) from the original file
     bname = os.path.basename(infile)
     bname = os.path.splitext(bname)[0]
-    fname = f"{bname}_{grid}_{method}.csv"
-    new_fname = os.path.join(DATA, fname)
-
-    # checking for previous data files
-    if os.path.isfile(new_fname):
-        os.remove(new_fname)
+    fnames = [f"{bname}_{grid}_{method}" for grid in grids]
+    new_fnames = [os.path.join(DATA, fname) for fname in fnames]
 
-    grid_x, grid_y = mesh_gen(grid)
-
-    if grid_x == None:
+    # parameters that must match for a checkpoint to be reused
+    try:
+        params = [
+            {
+                "input": datastore.fingerprint(infile),
+                "grid": grid,
+                "method": method,
+                "centroids": operator_cache.centroids_hash(x, y),
+                "neighbours": NEIGHBOURS,
+            }
+            for grid in grids
+        ]
+    except Exception as e:
+        print(f"Error reading input file: {e}")
+        return None
+    states = [
+        datastore.read_checkpoint(new_fname) if (RESUME or INCREMENTAL) and datastore.exists(new_fname) else None
+        for new_fname in new_fnames
+    ]
+    current = [
+        state if state is not None and state["params"] == param else None
+        for state, param in zip(states, params)
+    ]
+
+    # skip combinations completed by a previous run
+    if all(state is not None and state["complete"] for state in current):
+        print(f"Skipping {', '.join(fnames)}, already completed.")
+        return [state["result"] for state in current]
+
+    # get the centroids to grid operators once for every simulation and timestep
+    try:
+        ops = grid_operators(grids, method, x, y)
+    except Exception as e:
+        print(f"Error building RBF operator: {e}")
         return None
 
-    # imports centroids' parameters of each test (single line) into separate arrays
+    # resume every output from the last row flushed to all of them
+    done = [0 if state is None or not RESUME else min(state["rows"], datastore.n_rows(new_fname))
+            for state, new_fname in zip(current, new_fnames)]
+
+    # match rows of outputs interpolated with the same parameters from an older input
+    reuse = None
+    if INCREMENTAL:
+        try:
+            keys_in = datastore.load_keys(infile)
+            reuse = []
+            for state, param, new_fname in zip(states, params, new_fnames):
+                same = state is not None and all(
+                    state["params"].get(k) == v for k, v in param.items() if k != "input"
+                )
+                keys_out = datastore.load_keys(new_fname)[:state["rows"]] if same else keys_in[:0]
+                reuse.append(reuse_rows(keys_in, keys_out))
+        except Exception as e:
+            print(f"Error matching rows of previous outputs: {e}")
+            return None
+
+        n_new = max(int((r < 0).sum()) for r in reuse)
+        print(f"Found {n_new} new rows of {len(keys_in)} for {', '.join(fnames)}")
+        prefixes = [appended_rows(r) for r in reuse]
+        if all(prefix is not None for prefix in prefixes):
+            done, reuse = prefixes, None
+
+    start_row = 0 if reuse is not None else min(done)
+    elapsed_before, grid_times = 0.0, [0.0] * len(grids)
+    if start_row > 0:
+        print(f"Continuing {', '.join(fnames)} from row {start_row}")
+        if all(state is not None and state["rows"] == start_row for state in current):
+            elapsed_before = current[0]["elapsed"]
+            grid_times = [state["grid_time"] for state in current]
+
+    # checking for previous data files, outputs to rebuild are written aside
+    targets = new_fnames if reuse is None else [f"{new_fname}_rebuild" for new_fname in new_fnames]
+    olds = [None] * len(grids) if reuse is None else [datastore.load(new_fname) if datastore.exists(new_fname) else None
+                                                      for new_fname in new_fnames]
+    for target, (op, grid_x, grid_y) in zip(targets, ops):
+        if start_row > 0:
+            datastore.truncate(target, start_row)
+        else:
+            datastore.remove(target)
+            datastore.create(target, n_points=len(grid_x))
+    n_cols = [datastore.read_schema(target)["n_cols"] for target in targets]
+
+    def save_checkpoints(rows: int, results: list = None) -> None:
+        for new_fname, param, grid_time, result in zip(
+                new_fnames, params, grid_times, results or [None] * len(grids)):
+            datastore.write_checkpoint(new_fname, {
+                "params": param,
+                "rows": rows,
+                "complete": result is not None,
+                "result": result,
+                "elapsed": elapsed_before + time.time() - start_time,
+                "grid_time": grid_time,
+            })
+
+    # interpolates blocks of `BUFF_TSHOLD` simulations at once, onto every grid
+    rows = start_row
     try:
-        with open(infile, mode='r') as file:
-            reader = csv.reader(file)
-            next(reader)
-            bg_bf = []
-            # for each simulation
-            for k, row in enumerate(reader, start=1):
-                bf = []
-                # for each timestep
-                for j in range (0,20):
-                    # initialize arrays
-                    def_x = []
-                    def_y = []
-                    def_xy = []
-                    grid_def_x = []
-                    grid_def_y = []
-                    grid_def_xy = []
-                    c = j*564*3+j*2
-                    x_force = row[c]
-                    y_force = row[c+1]
-
-                    # for each element
-                    for i in range(c+2, c+2+564*3, 3):
-                        def_x.append(row[i])
-                        def_y.append(row[i + 1])
-                        def_xy.append(row[i + 2])
-
-                    def_x = np.array(def_x, dtype=float)
-                    def_y = np.array(def_y, dtype=float)
-                    def_xy = np.array(def_xy, dtype=float)
-
-                    # create RBF interpolators for each parameter
-                    rbf_def_x = Rbf(x, y, def_x, function=method)
-                    rbf_def_y = Rbf(x, y, def_y, function=method)
-                    rbf_def_xy = Rbf(x, y, def_xy, function=method)
-
-                    # interpolate on the grid
-                    grid_def_x = rbf_def_x(grid_x, grid_y)
-                    grid_def_y = rbf_def_y(grid_x, grid_y)
-                    grid_def_xy = rbf_def_xy(grid_x, grid_y)
-                    
-                    # replace nan values with 0
-                    grid_def_x = np.nan_to_num(grid_def_x)
-                    grid_def_y = np.nan_to_num(grid_def_y)
-                    grid_def_xy = np.nan_to_num(grid_def_xy)
-
-                    bf.append(x_force)
-                    bf.append(y_force)
-
-                    for i in range(0, len(grid_def_x)):
-                        bf.append(grid_def_x[i])
-                        bf.append(grid_def_y[i])
-                        bf.append(grid_def_xy[i])
-
-                # dump buffer to big buffer
-                bg_bf.append(bf)
-                
-                # dump big buffer to file
-                if len(bg_bf) == BUFF_TSHOLD and not os.path.isfile(new_fname):
-                    p = pd.DataFrame(bg_bf)
-                    p.to_csv(new_fname, mode="a", header=True, index=False)
-                    bg_bf = []
-                elif len(bg_bf) == BUFF_TSHOLD and os.path.isfile(new_fname):
-                    p = pd.DataFrame(bg_bf)
-                    p.to_csv(new_fname, mode="a", header=False, index=False)
-                    bg_bf = []
-        
-        p = pd.DataFrame(bg_bf)
-        p.to_csv(new_fname, mode="a", header=False, index=False)
+        for block in datastore.iter_blocks(infile, BUFF_TSHOLD, start=start_row):
+            forces, strains = split_timesteps(block)
+            keys = datastore.row_keys(block)
+            for i, (target, (op, _, _)) in enumerate(zip(targets, ops)):
+                grid_start = time.time()
+
+                # only new rows are interpolated, the others are copied from the old output
+                new = np.ones(len(block), dtype=bool) if reuse is None else reuse[i][rows:rows + len(block)] < 0
+                grid_rows = np.empty((len(block), n_cols[i]))
+                if (~new).any():
+                    grid_rows[~new] = olds[i][reuse[i][rows:rows + len(block)][~new]]
+                if new.any():
+                    grid_strains = interpolate_batch(op, strains[new])
+                    grid_rows[new] = join_timesteps(forces[new], grid_strains)
+
+                # dump block to file
+                datastore.append(target, grid_rows, keys=keys, sync=RESUME)
+                grid_times[i] += time.time() - grid_start
+
+            # record rows flushed to every output
+            rows += len(block)
+            if RESUME and reuse is None:
+                save_checkpoints(rows)
+
+        # replace outputs with the rebuilt ones
+        if reuse is not None:
+            olds = None
+            for target, new_fname in zip(targets, new_fnames):
+                datastore.move(target, new_fname)
 
     except Exception as e:
         print(f"Error interpolating input file: {e}")
@@ -174,21 +373,29 @@ def interpolator(infile: str, grid: int, method: str, x: NDArray[np.float64], y:
 
     # end the timer and calculate elapsed time in minutes and seconds
     end_time = time.time()
-    elapsed_time = end_time - start_time
+    elapsed_time = elapsed_before + end_time - start_time
     elapsed_minutes = int(elapsed_time // 60)
     elapsed_seconds = int(elapsed_time % 60)
 
     # print total elapsed time in "minutes:seconds" format
     print(
-        f"Finished processing {fname} in {elapsed_minutes}:{elapsed_seconds:02d} minutes."
+        f"Finished processing {', '.join(fnames)} in {elapsed_minutes}:{elapsed_seconds:02d} minutes."
     )
 
-    return {
+    shared_time = (elapsed_time - sum(grid_times)) / len(grids)
+    results = [
+        {
             "grid": grid,
             "method": method,
-            "file": os.path.splitext(os.path.basename(infile))[0],
-            "interpolation_duration": elapsed_time
-            }
+            "file": bname,
+            "interpolation_duration": grid_time + shared_time
+        }
+        for grid, grid_time in zip(grids, grid_times)
+    ]
+    if RESUME or INCREMENTAL:
+        save_checkpoints(rows, results)
+
+    return results
 
 def main():
     """
@@ -219,17 +426,21 @@ def main():
         print(f"Error importing centroid coordinates: {e}")
         return 1
 
-    for grid in GRIDS:
-        for method in METHODS:
-            for file in IN_FILES:
-                result = interpolator(file, grid, method, x, y)
-                if result == None:  # ensure result is not None
-                    return 1
-                # save results
-                result_df = pd.DataFrame([result])
-                write_header = not os.path.exists(METRICS)
-                result_df.to_csv(METRICS, mode="a", header=write_header, index=False)
-                print(f"Metrics saved to {METRICS}")
+    def save_result(job: tuple, result: List[dict]) -> None:
+        # save results of every grid as jobs complete
+        result_df = pd.DataFrame(result)
+        write_header = not os.path.exists(METRICS)
+        result_df.to_csv(METRICS, mode="a", header=write_header, index=False)
+        print(f"Metrics saved to {METRICS}")
+
+    # independent jobs for every method and file, each one onto every grid
+    jobs = [
+        (file, GRIDS, method, x, y)
+        for method in METHODS
+        for file in IN_FILES
+    ]
+    if not run_jobs(interpolator, jobs, save_result):
+        return 1
 
     # end the timer and calculate elapsed time in minutes and seconds
     end_time = time.time()
@@ -0,0 +1,110 @@
+import numpy as np
+import pandas as pd
+from typing import Sequence
+from numpy.typing import NDArray
+
+# smallest denominator of percentage errors, as in `sklearn.metrics`
+EPSILON = np.finfo(np.float64).eps
+
+class MetricsAccumulator:
+    """
+    Online accumulator of regression metrics between true and predicted values of
+    `n_cols` columns, updated chunk by chunk of rows. Gives the same results as
+    `sklearn.metrics` `r2_score`, `mean_absolute_error` and
+    `mean_absolute_percentage_error` on the whole data (averaged uniformly over
+    columns), while only holding a few sums per column. Accumulators of separate
+    chunks (e.g. from parallel workers) can be merged.
+    """
+
+    def __init__(self, n_cols: int):
+        self.n = 0
+        self.mean = np.zeros(n_cols)  # mean of true values
+        self.m2 = np.zeros(n_cols)  # sum of squared deviations of true values from their mean
+        self.sse = np.zeros(n_cols)  # sum of squared errors
+        self.sae = np.zeros(n_cols)  # sum of absolute errors
+        self.sape = np.zeros(n_cols)  # sum of absolute percentage errors
+
+    def update(self, y_true: NDArray[np.float64], y_pred: NDArray[np.float64]) -> None:
+        """
+        Adds (`n`, `n_cols`) arrays `y_true` and `y_pred` of a chunk of rows.
+        """
+
+        y_true = np.asarray(y_true, dtype=np.float64)
+        y_pred = np.asarray(y_pred, dtype=np.float64)
+        if y_true.shape != y_pred.shape:
+            raise ValueError(f"Shapes {y_true.shape} and {y_pred.shape} don't match")
+        if len(y_true) == 0:
+            return
+
+        chunk = MetricsAccumulator(y_true.shape[1])
+        err = np.abs(y_true - y_pred)
+        chunk.n = len(y_true)
+        chunk.mean = y_true.mean(axis=0)
+        chunk.m2 = ((y_true - chunk.mean)**2).sum(axis=0)
+        chunk.sse = (err**2).sum(axis=0)
+        chunk.sae = err.sum(axis=0)
+        chunk.sape = (err / np.maximum(np.abs(y_true), EPSILON)).sum(axis=0)
+        self.merge(chunk)
+
+    def merge(self, other: "MetricsAccumulator") -> "MetricsAccumulator":
+        """
+        Adds the rows accumulated by `other` to this accumulator, and returns it.
+        """
+
+        n = self.n + other.n
+        if other.n == 0:
+            return self
+
+        # pairwise update of the mean and squared deviations (Chan et al.)
+        delta = other.mean - self.mean
+        self.m2 = self.m2 + other.m2 + delta**2 * self.n * other.n / n
+        self.mean = self.mean + delta * other.n / n
+        self.sse = self.sse + other.sse
+        self.sae = self.sae + other.sae
+        self.sape = self.sape + other.sape
+        self.n = n
+
+        return self
+
+    def r2_columns(self) -> NDArray[np.float64]:
+        """
+        Returns the R-squared of every column. Constant columns score 1 if they are
+        predicted exactly and 0 otherwise, as in `sklearn.metrics r2_score`.
+        """
+
+        r2 = np.ones_like(self.sse)
+        valid = self.m2 != 0
+        r2[valid] = 1 - self.sse[valid] / self.m2[valid]
+        r2[~valid & (self.sse != 0)] = 0.0
+
+        return r2
+
+    def r2(self) -> float:
+        return float(np.mean(self.r2_columns()))
+
+    def mae(self) -> float:
+        return float(np.mean(self.sae / self.n))
+
+    def mape(self) -> float:
+        return float(np.mean(self.sape / self.n))
+
+    def breakdown(self, labels: Sequence, name: str = "column") -> pd.DataFrame:
+        """
+        Returns a table with the R-squared, MAE and MAPE of the columns grouped by
+        `labels` (one label per column, e.g. the name of each predicted parameter
+        or the timestep of each simulation value), averaged uniformly over the
+        columns of each group like the overall metrics.
+        """
+
+        labels = np.asarray(labels)
+        if labels.shape != self.sse.shape:
+            raise ValueError(f"{labels.size} labels don't match {self.sse.size} columns")
+
+        table = pd.DataFrame({
+            name: labels,
+            "r2": self.r2_columns(),
+            "mae": self.sae / self.n,
+            "mape": self.sape / self.n,
+        })
+
+        return table.groupby(name, sort=False).mean().reset_index()
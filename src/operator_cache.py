@@ -0,0 +1,111 @@
+import numpy as np
+import configparser
+import hashlib
+import json
+import os
+from typing import Optional, Tuple
+from numpy.typing import NDArray
+from src import file_cache
+
+# reading config file and accessing variables
+config = configparser.ConfigParser()
+try:
+    config.read(r"config/config.ini")
+    CACHE = config.get("Paths", "cache")
+    MAX_SIZE_MB = config.getfloat("Cache", "max_size_mb", fallback=1024)
+except Exception as e:
+    print(f"Error reading configuration file: {e}")
+    exit(1)
+
+def centroids_hash(x: NDArray[np.float64], y: NDArray[np.float64]) -> str:
+    """
+    Returns a hash of centroid coordinates `x` and `y`, so operators built from
+    an older centroids file are never matched.
+    """
+
+    xy = np.ascontiguousarray(np.column_stack([x, y]), dtype=np.float64)
+
+    return hashlib.sha256(xy.tobytes()).hexdigest()
+
+def operator_key(cent_hash: str, **params) -> str:
+    """
+    Returns the cache key of an operator built from centroids hashed to
+    `cent_hash` with the given `params` (grid size, method, kernel parameters...).
+    """
+
+    meta = json.dumps({"centroids": cent_hash, **params}, sort_keys=True)
+
+    return hashlib.sha256(meta.encode()).hexdigest()
+
+def _checksum(*arrays: NDArray) -> str:
+    h = hashlib.sha256()
+    for a in arrays:
+        h.update(np.ascontiguousarray(a).tobytes())
+    return h.hexdigest()
+
+def load_operator(key: str, cent_hash: str) -> Optional[Tuple[NDArray[np.float64], ...]]:
+    """
+    Loads the arrays stored under `key`, in the order they were saved. Returns
+    None if there is no entry, or if it fails the integrity checks, in which
+    case the entry is removed.
+    """
+
+    path = os.path.join(CACHE, f"{key}.npz")
+    if not os.path.isfile(path):
+        return None
+
+    try:
+        with np.load(path) as f:
+            n_arrays = int(f["n_arrays"])
+            arrays = tuple(f[f"arr_{i}"] for i in range(n_arrays))
+            valid = (
+                str(f["key"]) == key
+                and str(f["centroids"]) == cent_hash
+                and str(f["checksum"]) == _checksum(*arrays)
+            )
+    except Exception as e:
+        print(f"Error reading cached operator {path}: {e}")
+        valid = False
+
+    if not valid:
+        print(f"Discarding invalid cached operator {path}")
+        file_cache.remove(path)
+        return None
+
+    file_cache.touch(path)
+
+    return arrays
+
+def save_operator(key: str, cent_hash: str, *arrays: NDArray) -> None:
+    """
+    Saves `arrays` under `key`, then evicts the least recently used entries
+    until the cache fits in `MAX_SIZE_MB`.
+    """
+
+    os.makedirs(CACHE, exist_ok=True)
+    path = os.path.join(CACHE, f"{key}.npz")
+    tmp_path = file_cache.tmp_path(os.path.join(CACHE, key), ".npz")
+
+    # write to a temporary file first so a crash never leaves a partial entry
+    np.savez(
+        tmp_path,
+        key=key,
+        centroids=cent_hash,
+        checksum=_checksum(*arrays),
+        n_arrays=len(arrays),
+        **{f"arr_{i}": a for i, a in enumerate(arrays)}
+    )
+    file_cache.commit(tmp_path, path)
+
+    evict()
+
+def evict(max_size_mb: float = None) -> None:
+    """
+    Removes least recently used cache entries until the total cache size is
+    below `max_size_mb` (defaults to `MAX_SIZE_MB`).
+    """
+
+    if max_size_mb is None:
+        max_size_mb = MAX_SIZE_MB
+
+    file_cache.evict(CACHE, max_size_mb, suffix=".npz")
@@ -0,0 +1,158 @@
+import numpy as np
+from typing import List, Tuple
+from numpy.typing import NDArray
+from scipy import sparse
+from scipy.linalg import lu_factor, lu_solve
+from scipy.spatial import cKDTree
+from scipy.spatial.distance import cdist, pdist, squareform
+from scipy.special import xlogy
+
+# maximum number of kernel matrix entries held at once by local systems
+LOCAL_MAX_ENTRIES = 2**22
+
+# radial basis functions, with the same definitions as `scipy.interpolate Rbf`
+KERNELS = {
+    "multiquadric": lambda r, eps: np.sqrt((r / eps)**2 + 1),
+    "inverse": lambda r, eps: 1.0 / np.sqrt((r / eps)**2 + 1),
+    "gaussian": lambda r, eps: np.exp(-(r / eps)**2),
+    "linear": lambda r, eps: r,
+    "cubic": lambda r, eps: r**3,
+    "quintic": lambda r, eps: r**5,
+    "thin_plate": lambda r, eps: xlogy(r**2, r),
+}
+
+def rbf_epsilon(x: NDArray[np.float64], y: NDArray[np.float64]) -> float:
+    """
+    Returns the default shape parameter used by `scipy.interpolate Rbf` for nodes
+    with coordinates `x` and `y`, i.e. the average distance between nodes based on
+    their bounding box.
+    """
+
+    xi = np.vstack([x, y])
+    edges = np.amax(xi, axis=1) - np.amin(xi, axis=1)
+    edges = edges[np.nonzero(edges)]
+
+    return float(np.power(np.prod(edges) / xi.shape[1], 1.0 / edges.size))
+
+def rbf_operators(
+        x: NDArray[np.float64],
+        y: NDArray[np.float64],
+        evals: List[Tuple[NDArray[np.float64], NDArray[np.float64]]],
+        method: str,
+        epsilon: float = None
+    ) -> List[NDArray[np.float64]]:
+    """
+    Builds the (`m`,`n`) linear operators that map values known at the `n` nodes
+    (`x`, `y`) to each set of `m` evaluation points (`xi`, `yi`) of `evals`, using
+    any `method` from `scipy.interpolate Rbf`. The kernel system is factorized only
+    once for every set of evaluation points, and each operator gives the same
+    result as fitting an `Rbf` for every set of values.
+    """
+
+    if method not in KERNELS:
+        raise ValueError(f"Unknown RBF method: {method}")
+
+    kernel = KERNELS[method]
+    if epsilon is None:
+        epsilon = rbf_epsilon(x, y)
+
+    # kernel system between nodes
+    nodes = np.column_stack([x, y]).astype(float)
+    lu = lu_factor(kernel(squareform(pdist(nodes)), epsilon))
+
+    ops = []
+    for xi, yi in evals:
+        # phi @ inv(a), with phi the kernel values at evaluation points
+        points = np.column_stack([xi, yi]).astype(float)
+        phi = kernel(cdist(points, nodes), epsilon)
+        ops.append(lu_solve(lu, phi.T, trans=1).T)
+
+    return ops
+
+def rbf_operator(
+        x: NDArray[np.float64],
+        y: NDArray[np.float64],
+        xi: NDArray[np.float64],
+        yi: NDArray[np.float64],
+        method: str,
+        epsilon: float = None
+    ) -> NDArray[np.float64]:
+    """
+    Builds the (`m`,`n`) linear operator that maps values known at the `n` nodes
+    (`x`, `y`) to the `m` evaluation points (`xi`, `yi`), using any `method` from
+    `scipy.interpolate Rbf` (see `rbf_operators`).
+    """
+
+    return rbf_operators(x, y, [(xi, yi)], method, epsilon)[0]
+
+def local_rbf_operator(
+        x: NDArray[np.float64],
+        y: NDArray[np.float64],
+        xi: NDArray[np.float64],
+        yi: NDArray[np.float64],
+        method: str,
+        k: int,
+        epsilon: float = None
+    ) -> sparse.csr_matrix:
+    """
+    Builds a sparse (`m`,`n`) operator like `rbf_operator`, but fitting each of the
+    `m` evaluation points (`xi`, `yi`) only from its `k` nearest nodes (`x`, `y`),
+    found with a KD-tree. Each row has `k` non-zero weights, so building and
+    applying the operator grows linearly with the number of nodes. With `k` equal
+    to the number of nodes it matches `rbf_operator`.
+    """
+
+    if method not in KERNELS:
+        raise ValueError(f"Unknown RBF method: {method}")
+
+    kernel = KERNELS[method]
+    if epsilon is None:
+        epsilon = rbf_epsilon(x, y)
+
+    nodes = np.column_stack([x, y]).astype(float)
+    points = np.column_stack([xi, yi]).astype(float)
+    k = min(k, len(nodes))
+
+    # k nearest nodes of each evaluation point
+    _, nbrs = cKDTree(nodes).query(points, k=k)
+    nbrs = nbrs.reshape(len(points), k)
+
+    # solve local systems in blocks of evaluation points to bound memory
+    block = max(1, LOCAL_MAX_ENTRIES // (k * k))
+    weights = np.empty((len(points), k))
+    for start in range(0, len(points), block):
+        local = nodes[nbrs[start:start + block]]
+        pts = points[start:start + block]
+
+        # local kernel systems and kernel values at the evaluation points
+        a = kernel(np.linalg.norm(local[:, :, None, :] - local[:, None, :, :], axis=-1), epsilon)
+        phi = kernel(np.linalg.norm(local - pts[:, None, :], axis=-1), epsilon)
+
+        # phi @ inv(a) for every point, using the symmetry of `a`
+        weights[start:start + block] = np.linalg.solve(a, phi[:, :, None])[:, :, 0]
+
+    indptr = np.arange(0, len(points) * k + 1, k)
+
+    return sparse.csr_matrix(
+        (weights.ravel(), nbrs.ravel(), indptr),
+        shape=(len(points), len(nodes))
+    )
+
+def apply_operator(op: NDArray[np.float64] | sparse.csr_matrix, values: NDArray[np.float64]) -> NDArray[np.float64]:
+    """
+    Applies operator `op` built by `rbf_operator` or `local_rbf_operator` to
+    `values`, an array of shape (..., `n`, `c`) holding `c` components at the `n`
+    nodes, for any number of leading (simulation, timestep) axes. Returns an array
+    of shape (..., `m`, `c`).
+    All leading axes and components are mapped with one matrix product.
+    """
+
+    values = np.asarray(values, dtype=float)
+    lead = values.shape[:-2]
+    n, c = values.shape[-2:]
+
+    # gather every set of values as a column of a single (`n`, ...) matrix
+    cols = np.moveaxis(values, -2, 0).reshape(n, -1)
+    res = op @ cols
+
+    return np.moveaxis(res.reshape((op.shape[0],) + lead + (c,)), 0, -2)
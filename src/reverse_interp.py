@@ -6,9 +6,11 @@ import time
 import pandas as pd
 from typing import Tuple
 from numpy.typing import NDArray
-from scipy.interpolate import Rbf
-from sklearn.metrics import r2_score,mean_absolute_error,mean_absolute_percentage_error
-from mesh_interp import mesh_gen
+from src.mesh_interp import grid_operator, round_trip_operator, interpolate_batch
+from src.dataset import split_timesteps, join_timesteps, column_timesteps
+from src.executor import run_jobs
+from src.metrics import MetricsAccumulator
+from src import datastore, splits
 
 # Reading configuration file
 config = configparser.ConfigParser()
@@ -17,20 +19,26 @@ config.read(r"config/config.ini")
 # Accessing variables
 DATA = config.get("Paths", "data_cleaned")
 INT_P = config.get("Files", "centroids")
-X_TRAIN = config.get("Files", "x_train")
-X_TEST = config.get("Files", "x_test")
+X_DATA = config.get("Files", "x_data")
 REV_METRICS = config.get("Files", "rev_interp_metrics")
+ROUND_TRIP = config.getboolean("Reverse", "round_trip", fallback=False)
+STEP_METRICS = f"{os.path.splitext(REV_METRICS)[0]}_timesteps.csv"
 
-IN_FILES = [X_TRAIN]
+IN_FILES = [X_DATA]
 GRIDS = [20, 30, 40]
 METHODS = ["linear", "cubic", "multiquadric"]
 BUFF_TSHOLD = 100
 
 def inv_interpolator(infile: str, grid: int, method: str, x: NDArray[np.float64], y: NDArray[np.float64]):
     """
-    Interpolates `infile` csv data file with a mesh grid of `grid`x`grid` points
+    Interpolates the training rows of `infile` dataset with a mesh grid of `grid`x`grid` points
     using any `method` from `scipy.interpolate Rbf`. Integration points coordinates `x` and `y` must
     be given.
+    If `ROUND_TRIP`, simulations are interpolated onto the grid and back onto the
+    centroids in memory, block by block, with the composite `round_trip_operator`,
+    so neither the grid nor the inverse datasets are read or written. Otherwise the grid dataset from `mesh_interp`
+    is interpolated back and saved as an `_inv` dataset. Metrics are accumulated
+    block by block in both cases.
     """
     # start timer
     start_time = time.time()
@@ -38,119 +46,59 @@ def inv_interpolator(infile: str, grid: int, method: str, x: NDArray[np.float64]
     # extract the base name (without extension) from the original file
     bname = os.path.basename(infile)
     bname = os.path.splitext(bname)[0]
-    fname = f"{bname}_{grid}_{method}.csv"
+    fname = f"{bname}_{grid}_{method}"
     new_fname = os.path.join(DATA, fname)
-    fname_inv = f"{bname}_{grid}_{method}_inv.csv"
+    fname_inv = f"{bname}_{grid}_{method}_inv"
     new_fname_inv = os.path.join(DATA, fname_inv)
 
     # checking for interpolated data
-    if not os.path.isfile(new_fname):
+    if not ROUND_TRIP and not datastore.exists(new_fname):
         print("No interpolated data file to open")
         return None
 
     # checking for previous data files
-    if os.path.isfile(new_fname_inv):
-        os.remove(new_fname_inv)
+    datastore.remove(new_fname_inv)
 
-    grid_x, grid_y = mesh_gen(grid)
-
-    if grid_x == None:
+    # get the grid operators once for every simulation and timestep
+    try:
+        if ROUND_TRIP:
+            op = round_trip_operator(grid, method, x, y)
+        else:
+            op, grid_x, grid_y = grid_operator(grid, method, x, y, reverse=True)
+    except Exception as e:
+        print(f"Error building RBF operator: {e}")
         return None
 
-    # imports centroids' parameters of each test (single line) into separate arrays
+    # interpolates blocks of `BUFF_TSHOLD` training simulations at once
     try:
-        with open(new_fname, mode='r') as file:
-            reader = csv.reader(file)
-            next(reader)
-            bg_bf = []
-            # for each simulation
-            for k, row in enumerate(reader, start=1):
-                bf = []
-                n_el = int((len(row)/20-2)/3)
-                # for each timestep
-                for j in range (0,20):
-                    # initialize arrays
-                    def_x = []
-                    def_y = []
-                    def_xy = []
-                    grid_def_x = []
-                    grid_def_y = []
-                    grid_def_xy = []
-                    c = j*n_el*3+j*2
-                    x_force = row[c]
-                    y_force = row[c+1]
-
-                    # for each element
-                    for i in range(c+2, c+2+n_el*3, 3):
-                        def_x.append(row[i])
-                        def_y.append(row[i + 1])
-                        def_xy.append(row[i + 2])
-
-                    def_x = np.array(def_x, dtype=float)
-                    def_y = np.array(def_y, dtype=float)
-                    def_xy = np.array(def_xy, dtype=float)
-
-                    # create RBF interpolators for each parameter
-                    rbf_def_x = Rbf(grid_x, grid_y, def_x, function=method)
-                    rbf_def_y = Rbf(grid_x, grid_y, def_y, function=method)
-                    rbf_def_xy = Rbf(grid_x, grid_y, def_xy, function=method)
-
-                    # interpolate on the grid
-                    grid_def_x = rbf_def_x(x, y)
-                    grid_def_y = rbf_def_y(x, y)
-                    grid_def_xy = rbf_def_xy(x, y)
-                    
-                    # replace nan values with 0
-                    grid_def_x = np.nan_to_num(grid_def_x)
-                    grid_def_y = np.nan_to_num(grid_def_y)
-                    grid_def_xy = np.nan_to_num(grid_def_xy)
-
-                    bf.append(x_force)
-                    bf.append(y_force)
-
-                    for i in range(0, len(grid_def_x)):
-                        bf.append(grid_def_x[i])
-                        bf.append(grid_def_y[i])
-                        bf.append(grid_def_xy[i])
-
-                # dump buffer to big buffer
-                bg_bf.append(bf)
-                
-                # dump big buffer to file
-                if len(bg_bf) == BUFF_TSHOLD and not os.path.isfile(new_fname_inv):
-                    p = pd.DataFrame(bg_bf)
-                    p.to_csv(new_fname_inv, mode="a", header=True, index=False)
-                    bg_bf = []
-                elif len(bg_bf) == BUFF_TSHOLD and os.path.isfile(new_fname_inv):
-                    p = pd.DataFrame(bg_bf)
-                    p.to_csv(new_fname_inv, mode="a", header=False, index=False)
-                    bg_bf = []
-
-        p = pd.DataFrame(bg_bf)
-        p.to_csv(new_fname_inv, mode="a", header=False, index=False)
+        train, _ = splits.load_split(n_rows=datastore.n_rows(infile))
+        acc = MetricsAccumulator(datastore.read_schema(infile)["n_cols"])
+        if not ROUND_TRIP:
+            datastore.create(new_fname_inv, n_points=len(x))
+            blocks = zip(
+                datastore.iter_rows(infile, train, BUFF_TSHOLD),
+                datastore.iter_rows(new_fname, train, BUFF_TSHOLD)
+            )
+        else:
+            blocks = ((block, block) for block in datastore.iter_rows(infile, train, BUFF_TSHOLD))
+
+        for ori, block in blocks:
+            forces, strains = split_timesteps(block)
+            predict = join_timesteps(forces, interpolate_batch(op, strains))
+
+            # dump block to file
+            if not ROUND_TRIP:
+                datastore.append(new_fname_inv, predict)
+
+            # calculates metrics
+            acc.update(ori, predict)
 
     except Exception as e:
         print(f"Error interpolating input file: {e}")
         return None
 
-    # gets preficted file data
-    try:
-        ori = pd.read_csv(infile)
-        predict = pd.read_csv(new_fname_inv)
+    r2, mae, mape = acc.r2(), acc.mae(), acc.mape()
 
-    except Exception as e:
-        print(f"Error reading interpolated files for metrics: {e}")
-        return None
-    
-    # calculates metrics
-    try:
-        r2 = r2_score(ori, predict)
-        mae = mean_absolute_error(ori, predict)
-        mape = mean_absolute_percentage_error(ori, predict)
-    except Exception as e:
-        print(f"Error calculating performance metrics: {e}")
-        return
-    
     print(f'R-squared on {method} method for {grid} grid: {r2}')
     print(f'MAE on {method} method for {grid} grid: {mae}')
     print(f'MAPE on {method} method for {grid} grid: {mape}')
@@ -171,7 +119,8 @@ def inv_interpolator(infile: str, grid: int, method: str, x: NDArray[np.float64]
             "method": method,
             "r2": r2,
             "mae": mae,
-            "mape": mape
+            "mape": mape,
+            "timesteps": acc.breakdown(column_timesteps(len(x)), name="timestep"),
             }
 
 def main():
@@ -183,8 +132,9 @@ def main():
     start_time = time.time()
 
     # checking for previous data files
-    if os.path.exists(REV_METRICS):
-        os.remove(REV_METRICS)
+    for metrics_file in (REV_METRICS, STEP_METRICS):
+        if os.path.exists(metrics_file):
+            os.remove(metrics_file)
 
     # importing x,y centroids coordinates into arrays
     x, y = [], []
@@ -203,17 +153,26 @@ def main():
         print(f"Error importing centroid coordinates: {e}")
         return 1
 
-    for grid in GRIDS:
-        for method in METHODS:
-            for file in IN_FILES:
-                result = inv_interpolator(file, grid, method, x, y) 
-                if result == None:  # ensure result is not None
-                    return 1
-                # save results
-                result_df = pd.DataFrame([result])
-                write_header = not os.path.exists(REV_METRICS)
-                result_df.to_csv(REV_METRICS, mode="a", header=write_header, index=False)
-                print(f"Metrics saved to {REV_METRICS}")
+    def save_result(job: tuple, result: dict) -> None:
+        # save results as jobs complete, with the breakdown by timestep apart
+        steps_df = result.pop("timesteps")
+        steps_df.insert(0, "method", result["method"])
+        steps_df.insert(0, "grid", result["grid"])
+        result_df = pd.DataFrame([result])
+        for df, metrics_file in ((result_df, REV_METRICS), (steps_df, STEP_METRICS)):
+            write_header = not os.path.exists(metrics_file)
+            df.to_csv(metrics_file, mode="a", header=write_header, index=False)
+        print(f"Metrics saved to {REV_METRICS} and {STEP_METRICS}")
+
+    # independent jobs for every grid, method and file
+    jobs = [
+        (file, grid, method, x, y)
+        for grid in GRIDS
+        for method in METHODS
+        for file in IN_FILES
+    ]
+    if not run_jobs(inv_interpolator, jobs, save_result):
+        return 1
 
     # end the timer and calculate elapsed time in minutes and seconds
     end_time = time.time()
@@ -0,0 +1,116 @@
+import numpy as np
+import configparser
+import os
+from typing import Dict, Tuple
+from numpy.typing import NDArray
+
+# reading config file and accessing variables
+config = configparser.ConfigParser()
+try:
+    config.read(r"config/config.ini")
+    SPLITS = config.get("Files", "splits")
+    SPLIT = config.get("Split", "name", fallback="holdout")
+    SEED = config.getint("Split", "seed", fallback=42)
+    TEST_SIZE = config.getint("Split", "test_size", fallback=260)
+    FOLDS = config.getint("Split", "folds", fallback=5)
+    REPEATS = config.getint("Split", "repeats", fallback=5)
+except Exception as e:
+    print(f"Error reading configuration file: {e}")
+    exit(1)
+
+Split = Tuple[NDArray[np.int64], NDArray[np.int64]]
+
+def holdout(n_rows: int, test_size: int, seed: int) -> Split:
+    """
+    Returns sorted (`train`, `test`) row indices of a random holdout split of
+    `n_rows` rows with `test_size` test rows, reproducible from `seed`.
+    """
+
+    rng = np.random.default_rng(seed)
+    test = np.sort(rng.choice(n_rows, size=test_size, replace=False))
+
+    return np.setdiff1d(np.arange(n_rows), test), test
+
+def kfold(n_rows: int, folds: int, seed: int) -> Dict[str, Split]:
+    """
+    Returns the (`train`, `test`) row indices of every fold of a random k-fold
+    split of `n_rows` rows into `folds` folds, named `kfold_1`, `kfold_2`...
+    """
+
+    rng = np.random.default_rng(seed)
+    parts = np.array_split(rng.permutation(n_rows), folds)
+
+    return {
+        f"kfold_{i}": (np.setdiff1d(np.arange(n_rows), test), np.sort(test))
+        for i, test in enumerate(parts, start=1)
+    }
+
+def repeated_holdout(n_rows: int, test_size: int, repeats: int, seed: int) -> Dict[str, Split]:
+    """
+    Returns `repeats` independent holdout splits of `n_rows` rows, named
+    `repeat_1`, `repeat_2`...
+    """
+
+    seeds = np.random.SeedSequence(seed).spawn(repeats)
+
+    return {
+        f"repeat_{i}": holdout(n_rows, test_size, np.random.default_rng(s).integers(2**63))
+        for i, s in enumerate(seeds, start=1)
+    }
+
+def make_splits(n_rows: int, seed: int = None) -> Dict[str, Split]:
+    """
+    Returns every split of `n_rows` rows used by the pipeline: the `holdout`
+    split, plus `FOLDS` k-fold and `REPEATS` repeated holdout splits, all of
+    them reproducible from `seed` (defaults to `SEED`).
+    """
+
+    if seed is None:
+        seed = SEED
+
+    splits = {"holdout": holdout(n_rows, TEST_SIZE, seed)}
+    if FOLDS > 1:
+        splits.update(kfold(n_rows, FOLDS, seed))
+    if REPEATS > 0:
+        splits.update(repeated_holdout(n_rows, TEST_SIZE, REPEATS, seed))
+
+    return splits
+
+def save_splits(splits: Dict[str, Split], n_rows: int, path: str = None) -> None:
+    """
+    Saves row indices of `splits` over a dataset of `n_rows` rows to `path`
+    (defaults to `SPLITS`).
+    """
+
+    if path is None:
+        path = SPLITS
+
+    arrays = {"n_rows": np.array(n_rows)}
+    for name, (train, test) in splits.items():
+        arrays[f"{name}_train"] = train
+        arrays[f"{name}_test"] = test
+
+    # write to a temporary file first so a crash never leaves partial splits
+    tmp_path = f"{os.path.splitext(path)[0]}.tmp.npz"
+    np.savez(tmp_path, **arrays)
+    os.replace(tmp_path, path)
+
+def load_split(name: str = None, n_rows: int = None, path: str = None) -> Split:
+    """
+    Returns the (`train`, `test`) row indices of split `name` (defaults to
+    `SPLIT`) saved at `path` (defaults to `SPLITS`). If `n_rows` is given, the
+    split must have been made for a dataset of that many rows.
+    """
+
+    if name is None:
+        name = SPLIT
+    if path is None:
+        path = SPLITS
+
+    with np.load(path) as f:
+        if n_rows is not None and int(f["n_rows"]) != n_rows:
+            raise ValueError(f"Splits in {path} were made for {int(f['n_rows'])} rows, not {n_rows}")
+        if f"{name}_train" not in f:
+            raise ValueError(f"Unknown split {name} in {path}")
+
+        return f[f"{name}_train"], f[f"{name}_test"]
@@ -1,14 +1,12 @@
 import pandas as pd
 import os
-from sklearn.metrics import (
-    r2_score,
-    mean_absolute_error,
-    mean_absolute_percentage_error
-)
 from sklearn.preprocessing import StandardScaler
 import configparser
 import time
 import joblib
+from src.dataset import open_dataset, feature_names
+from src import splits
+from src.metrics import MetricsAccumulator
 
 # reading config file and accessing variables
 config = configparser.ConfigParser()
@@ -16,7 +14,7 @@ try:
     config.read(r"config/config.ini")
     DATA = config.get("Paths", "data_cleaned")
     MODELS = config.get("Paths", "models")
-    Y_TEST = config.get("Files", "y_test")
+    Y_DATA = config.get("Files", "y_data")
     METRICS = config.get("Files", "test_metrics")
 except Exception as e:
     print(f"Error reading configuration file: {e}")
@@ -24,6 +22,8 @@ except Exception as e:
 
 GRIDS = [20, 30, 40]
 METHODS = ["linear", "cubic", "multiquadric"]
+CHUNK_ROWS = 1000
+PARAM_METRICS = f"{os.path.splitext(METRICS)[0]}_params.csv"
 
 def test_and_evaluate(grid, method, test_method):
     # IMPORT THE FILTERED DATA FOR TESTING
@@ -32,8 +32,8 @@ def test_and_evaluate(grid, method, test_method):
     # CHANGE NUMBERS ON THE MODEL NAME FILE FOR THE DESIRED MODEL
 
     # construct paths to the testing files
-    x_test = os.path.join(
-        DATA, f"x_test_{grid}_{test_method}.csv"
+    x_data = os.path.join(
+        DATA, f"x_data_{grid}_{test_method}"
     )
     xgb_model = os.path.join(
         MODELS, f"xgb_{grid}_{method}.joblib"
@@ -42,39 +42,25 @@ def test_and_evaluate(grid, method, test_method):
         MODELS, f"scaler_{grid}_{method}.joblib"
     )
 
-    # load feature and target data
+    # load feature and target data of the testing rows
     try:
-        print(f"Loading data from {x_test} and {Y_TEST}")
-        X_test = pd.read_csv(x_test)
-        y_test = pd.read_csv(Y_TEST)
-    except FileNotFoundError as e:
+        print(f"Loading data from {x_data} and {Y_DATA}")
+        y_data = pd.read_csv(Y_DATA)
+        _, test = splits.load_split(n_rows=len(y_data))
+        ds = open_dataset(x_data, rows=test)
+        X_test = pd.DataFrame(ds.data, columns=feature_names(ds.n_points))
+        y_test = y_data.iloc[test].reset_index(drop=True)
+    except (FileNotFoundError, ValueError) as e:
         print(f"Error loading files: {e}")
         return
 
-    # get number of columns and points
-    n_cols = len(X_test.columns)
-    points = int((n_cols/20-2)/3)
-
-    # define columns for X_test
-    l=[]
-    for x in range(1,21): # each timestep
-        l.append("Force_x_"+str(x))
-        l.append("Force_y_"+str(x))
-        for p in range(1, points+1):  # elements number
-            l.append("Strain_x_"+str(p)+"_"+str(x))
-            l.append("Strain_y_"+str(p)+"_"+str(x))
-            l.append("Strain_xy_"+str(p)+"_"+str(x))
-    
-    # assign defined column names to X_train
-    X_test.columns = l
     # print(f"X_train shape: {X_test.shape}")
 
     # loading scaler
     try:
         scaler = joblib.load(scaler_file)
-        X_test_scaled = scaler.transform(X_test)
     except Exception as e:
-        print(f"Error loading or applying scaler: {e}")
+        print(f"Error loading scaler: {e}")
         return
 
     # load trained model
@@ -86,16 +72,28 @@ def test_and_evaluate(grid, method, test_method):
         print(f"Error loading model: {e}")
         return
 
+    # predicted y data is saved to csv file as it is computed
+    pred_params_path = os.path.join(DATA, f"y_pred_{grid}_{method}_{test_method}.csv")
+    if os.path.exists(pred_params_path):
+        os.remove(pred_params_path)
+
     # start timer
     start_time = time.time()
 
-    # predict training values
+    # scale, predict testing values and accumulate performance chunk by chunk
+    acc = MetricsAccumulator(y_test.shape[1])
     try:
-        y_test_pred = modelo.predict(X_test_scaled)
+        for i in range(0, len(X_test), CHUNK_ROWS):
+            X_test_scaled = scaler.transform(X_test.iloc[i:i + CHUNK_ROWS])
+            y_test_pred = modelo.predict(X_test_scaled)
+            acc.update(y_test.iloc[i:i + CHUNK_ROWS], y_test_pred)
+
+            df = pd.DataFrame(y_test_pred, index=range(i, i + len(y_test_pred)))
+            df.to_csv(pred_params_path, mode="a", header=i == 0, index=False)
     except Exception as e:
         print(f"Error predicting values: {e}")
         return
-    
+
     # end the timer and calculate elapsed time in minutes and seconds
     end_time = time.time()
     elapsed_time = end_time - start_time
@@ -106,25 +104,14 @@ def test_and_evaluate(grid, method, test_method):
     print(
         f"Finished testing {xgb_model} in {elapsed_minutes}:{elapsed_seconds:02d} minutes."
     )
-    
+
     # performance on testing data
-    try:
-        r2_test = r2_score(y_test, y_test_pred)
-        mae_test = mean_absolute_error(y_test, y_test_pred)
-        mape_test = mean_absolute_percentage_error(y_test, y_test_pred)
-    except Exception as e:
-        print(f"Error calculating performance metrics: {e}")
-        return
-    
+    r2_test, mae_test, mape_test = acc.r2(), acc.mae(), acc.mape()
+
     print(f'R-squared on {test_method} test for {grid}_{method} model: {r2_test}')
     print(f'MAE on {test_method} test for {grid}_{method} model: {mae_test}')
     print(f'MAPE on {test_method} test for {grid}_{method} model: {mape_test}')
 
-    # saves predicted y data to csv file
-    pred_params_path = os.path.join(DATA, f"y_pred_{grid}_{method}_{test_method}.csv")
-    df = pd.DataFrame(y_test_pred)
-    df.to_csv(pred_params_path, mode="w", header=True, index=False)
-
     return {
         "grid": grid,
         "model_method": method,
@@ -132,7 +119,8 @@ def test_and_evaluate(grid, method, test_method):
         "r2": r2_test,
         "mae": mae_test,
         "mape": mape_test,
-        "testing_duration": elapsed_time
+        "testing_duration": elapsed_time,
+        "parameters": acc.breakdown(y_test.columns, name="parameter"),
     }
 
 def main():
@@ -143,9 +131,10 @@ def main():
     # start timer
     start_time = time.time()
 
-    # check if the file exists and delete it if it does
-    if os.path.exists(METRICS):
-        os.remove(METRICS)
+    # check if the files exist and delete them if they do
+    for metrics_file in (METRICS, PARAM_METRICS):
+        if os.path.exists(metrics_file):
+            os.remove(metrics_file)
 
     # iterate over the main folder numbers and subfolder numbers to train and evaluate models
     for grid in GRIDS:
@@ -154,11 +143,16 @@ def main():
                 result = test_and_evaluate(grid, method, test_method)
                 if result == None:  # ensure result is not None
                     return 1
-                # save results
+                # save results, with the breakdown by predicted parameter apart
+                params_df = result.pop("parameters")
+                params_df.insert(0, "test_method", test_method)
+                params_df.insert(0, "model_method", method)
+                params_df.insert(0, "grid", grid)
                 result_df = pd.DataFrame([result])
-                write_header = not os.path.exists(METRICS)
-                result_df.to_csv(METRICS, mode="a", header=write_header, index=False)
-                print(f"Testing performance metrics saved to {METRICS}")
+                for df, metrics_file in ((result_df, METRICS), (params_df, PARAM_METRICS)):
+                    write_header = not os.path.exists(metrics_file)
+                    df.to_csv(metrics_file, mode="a", header=write_header, index=False)
+                print(f"Testing performance metrics saved to {METRICS} and {PARAM_METRICS}")
 
     # end the timer and calculate elapsed time in minutes and seconds
     end_time = time.time()
@@ -1,16 +1,19 @@
 import configparser
+import numpy as np
 import pandas as pd
 import time
 import joblib
-from sklearn.metrics import (
-    r2_score,
-    mean_absolute_error,
-    mean_absolute_percentage_error,
-)
 from sklearn.multioutput import MultiOutputRegressor
 from sklearn.preprocessing import StandardScaler
 import xgboost as xgb
 import os
+import hashlib
+from typing import Iterator, List, Optional
+from numpy.typing import NDArray
+from src.dataset import open_dataset, feature_names
+from src import datastore, feature_cache, splits
+from src.metrics import MetricsAccumulator
+from src.executor import run_jobs, WORKERS
 
 # reading config file and accessing variables
 config = configparser.ConfigParser()
@@ -18,86 +21,312 @@ try:
     config.read(r"config/config.ini")
     DATA = config.get("Paths", "data_cleaned")
     MODELS = config.get("Paths", "models")
-    Y_TRAIN = config.get("Files", "y_train")
+    Y_DATA = config.get("Files", "y_data")
     METRICS = config.get("Files", "train_metrics")
+    ENGINE = config.get("Training", "engine", fallback="separate")
+    MULTI_STRATEGY = config.get("Training", "multi_strategy", fallback="one_output_per_tree")
+    CORES = config.getint("Training", "cores", fallback=0)
+    EARLY_STOPPING = config.getint("Training", "early_stopping_rounds", fallback=0)
+    VALIDATION_SIZE = config.getfloat("Training", "validation_size", fallback=0.1)
+    EXTERNAL_MEMORY = config.getboolean("Training", "external_memory", fallback=False)
 except Exception as e:
     print(f"Error reading configuration file: {e}")
     exit(1)
 
 GRIDS = [20, 30, 40]
 METHODS = ["linear", "cubic", "multiquadric"]
+CHUNK_ROWS = 1000
+PARAM_METRICS = f"{os.path.splitext(METRICS)[0]}_params.csv"
+ENGINES = ["separate", "native"]
+XGB_PARAMS = {"learning_rate": 0.02, "max_depth": 4, "n_estimators": 1000, "tree_method": "hist", "device": "cpu"}
 
-# Function to train and evaluate model
-def train_and_evaluate(grid: int, method: str):
+def make_model(engine: str = None, multi_strategy: str = None, n_jobs: int = None):
     """
-    Function to train and evaluate model, based on `grid` and `method` input variables.
+    Returns an untrained model predicting every target, for `engine` (defaults to
+    `ENGINE`): "separate" trains an independent booster per target, each building
+    its own histograms, while "native" trains a single XGBoost multi-target booster
+    sharing one quantized matrix across targets, with one tree per target and round
+    or, if `multi_strategy` (defaults to `MULTI_STRATEGY`) is "multi_output_tree",
+    trees with vector leaves predicting every target at once. Boosters use `n_jobs`
+    threads (defaults to every core).
     """
 
-    # construct paths to the training files
-    x_train = os.path.join(
-        DATA, f"x_train_{grid}_{method}.csv"
+    if engine is None:
+        engine = ENGINE
+    if multi_strategy is None:
+        multi_strategy = MULTI_STRATEGY
+
+    if engine == "separate":
+        return MultiOutputRegressor(xgb.XGBRegressor(**XGB_PARAMS, n_jobs=n_jobs))
+    if engine == "native":
+        return xgb.XGBRegressor(**XGB_PARAMS, n_jobs=n_jobs, multi_strategy=multi_strategy)
+    raise ValueError(f"Unknown training engine {engine}, expected one of {ENGINES}")
+
+def load_rows(grid: int, method: str, part: str):
+    """
+    Returns the features and targets of the `part` ("train" or "test") split rows of
+    the data interpolated on `grid` with `method`.
+    """
+
+    # construct paths to the interpolated files
+    x_data = os.path.join(
+        DATA, f"x_data_{grid}_{method}"
     )
 
-    # load feature and target data
+    print(f"Loading data from {x_data} and {Y_DATA}")
+    y_data = pd.read_csv(Y_DATA)
+    split = dict(zip(["train", "test"], splits.load_split(n_rows=len(y_data))))[part]
+    ds = open_dataset(x_data, rows=split)
+    X = pd.DataFrame(ds.data, columns=feature_names(ds.n_points))
+
+    return X, y_data.iloc[split].reset_index(drop=True)
+
+def train_blocks(grid: int, method: str) -> Iterator[pd.DataFrame]:
+    """
+    Yields the features of the training rows of the data interpolated on `grid`
+    with `method`, in blocks of `CHUNK_ROWS` rows, so only one block is held in
+    memory.
+    """
+
+    x_data = os.path.join(DATA, f"x_data_{grid}_{method}")
+    train, _ = splits.load_split(n_rows=datastore.n_rows(x_data))
+    columns = feature_names(datastore.read_schema(x_data)["n_points"])
+    for block in datastore.iter_rows(x_data, train, CHUNK_ROWS):
+        yield pd.DataFrame(block, columns=columns)
+
+class FeatureIter(xgb.DataIter):
+    """
+    Streams rows `rows` of memory-mapped float32 features `X` to XGBoost in chunks
+    of `CHUNK_ROWS` rows, so external memory matrices are built holding a single
+    chunk in memory. Their quantized pages are kept in files starting with
+    `cache_prefix`, removed with the matrix.
+    """
+
+    def __init__(self, X: NDArray[np.float32], rows: NDArray[np.int64], cache_prefix: str):
+        self.X = X
+        self.rows = rows
+        self.start = 0
+        super().__init__(cache_prefix=cache_prefix)
+
+    def next(self, input_data) -> bool:
+        if self.start >= len(self.rows):
+            return False
+        input_data(data=np.asarray(self.X[self.rows[self.start:self.start + CHUNK_ROWS]]))
+        self.start += CHUNK_ROWS
+        return True
+
+    def reset(self) -> None:
+        self.start = 0
+
+# quantized training data of the last (grid, method) used by this process
+_train_cache = {}
+
+def scaler_file(grid: int, method: str) -> str:
+    return os.path.join(MODELS, f"scaler_{grid}_{method}.joblib")
+
+def model_file(grid: int, method: str) -> str:
+    return os.path.join(MODELS, f"xgb_{grid}_{method}.joblib")
+
+def features_key(grid: int, method: str) -> str:
+    """
+    Returns the feature cache key of the training rows of `grid` and `method`,
+    which changes whenever their dataset, targets or split change.
+    """
+
+    x_data = os.path.join(DATA, f"x_data_{grid}_{method}")
+    train, _ = splits.load_split(n_rows=datastore.n_rows(x_data))
+    st = os.stat(Y_DATA)
+
+    return feature_cache.feature_key(
+        grid=grid,
+        method=method,
+        x_data=datastore.fingerprint(x_data),
+        y_data={"size": st.st_size, "mtime_ns": st.st_mtime_ns},
+        train=hashlib.sha256(train.tobytes()).hexdigest(),
+    )
+
+def prepare_features(grid: int, method: str) -> Optional[str]:
+    """
+    Fits the feature scaler of the model of `grid` and `method` on its training
+    rows and saves it, with the scaled training rows cached for training units and
+    later runs. Reuses cached features if the data hasn't changed since. Returns
+    the feature cache key, or None if data can't be loaded.
+    """
+
     try:
-        print(f"Loading data from {x_train} and {Y_TRAIN}")
-        X_train = pd.read_csv(x_train)
-        y_train = pd.read_csv(Y_TRAIN)
-    except FileNotFoundError as e:
+        key = features_key(grid, method)
+        cached = feature_cache.load_features(key)
+        if cached is None and EXTERNAL_MEMORY:
+            # stream the training rows twice, to fit the scaler and then to scale them
+            scaler = StandardScaler()
+            for block in train_blocks(grid, method):
+                scaler.partial_fit(block)
+            y_data = pd.read_csv(Y_DATA)
+            train, _ = splits.load_split(n_rows=len(y_data))
+            chunks = (scaler.transform(block).astype(np.float32) for block in train_blocks(grid, method))
+            feature_cache.save_features(key, chunks, y_data.iloc[train].reset_index(drop=True), scaler)
+            print(f"Training features of {grid}_{method} cached")
+        elif cached is None:
+            X_train, y_train = load_rows(grid, method, "train")
+            scaler = StandardScaler().fit(X_train)
+            # xgboost bins float32 values, so this halves memory without changing models
+            feature_cache.save_features(key, [scaler.transform(X_train).astype(np.float32)], y_train, scaler)
+            print(f"Training features of {grid}_{method} cached")
+        else:
+            scaler = cached[2]
+            print(f"Using cached training features of {grid}_{method}")
+    except (FileNotFoundError, ValueError) as e:
         print(f"Error loading files: {e}")
         return
 
-    # get number of columns and points
-    n_cols = len(X_train.columns)
-    points = int((n_cols/20-2)/3)
-
-    # define columns for X_train
-    l = []
-    for x in range(1, 21): # each timestep
-        l.append("Force_x_" + str(x))
-        l.append("Force_y_" + str(x))
-        for p in range(1, points+1):  # elements number
-            l.append("Strain_x_" + str(p) + "_" + str(x))
-            l.append("Strain_y_" + str(p) + "_" + str(x))
-            l.append("Strain_xy_" + str(p) + "_" + str(x))
-
-    # assign the defined column names to X_train
-    X_train.columns = l
-    # print(f"X_train shape: {X_train.shape}")
-
-    # scaler
-    scaler = StandardScaler()
-    X_train_scaled = scaler.fit_transform(X_train)
-
-    # set path for scaler file
-    scaler_file = os.path.join(
-        MODELS, f"scaler_{grid}_{method}.joblib"
-    )
-
     # dump the scaler to a file
-    joblib.dump(scaler, scaler_file)
+    joblib.dump(scaler, scaler_file(grid, method))
+
+    return key
+
+def scaled_rows(grid: int, method: str, key: str):
+    """
+    Returns the scaled features and the targets of the training rows of `grid` and
+    `method`, from the feature cache entry `key` or, if it was evicted, scaled
+    again with the saved scaler (not with external memory, which never loads the
+    whole features).
+    """
+
+    cached = feature_cache.load_features(key)
+    if cached is not None:
+        return cached[:2]
+    if EXTERNAL_MEMORY:
+        raise FileNotFoundError(f"Cached features of {grid}_{method} were evicted, features_max_size_mb is too small")
+
+    X_train, y_train = load_rows(grid, method, "train")
+    scaler = joblib.load(scaler_file(grid, method))
+
+    return scaler.transform(X_train).astype(np.float32), y_train
+
+def quantized_rows(grid: int, method: str, key: str, n_jobs: int):
+    """
+    Returns the quantized training matrix of `grid` and `method` with its targets
+    and, with early stopping, the quantized matrix of the validation rows (a seeded
+    `VALIDATION_SIZE` fraction of the training rows, left out of the training
+    matrix) with its targets, or None. Matrices are kept in memory while the
+    following units of this process train on the same data, so features are binned
+    once per model instead of once per target. With external memory, features are
+    streamed from the feature cache and binned pages are kept on disk.
+    """
+
+    if (grid, method) not in _train_cache:
+        _train_cache.clear()
+        X_train, y_train = scaled_rows(grid, method, key)
+        fit, val = np.arange(len(X_train)), None
+        dval, y_val = None, None
+        if EARLY_STOPPING:
+            fit, val = splits.holdout(len(X_train), max(1, round(VALIDATION_SIZE * len(X_train))), splits.SEED)
+            y_train, y_val = y_train.iloc[fit], y_train.iloc[val]
+
+        if EXTERNAL_MEMORY:
+            if not hasattr(xgb, "ExtMemQuantileDMatrix"):
+                raise ValueError(f"External memory training needs xgboost 3, found {xgb.__version__}")
+            prefix = f"{feature_cache.entry_dir(key)}.{os.getpid()}.tmp"
+            dtrain = xgb.ExtMemQuantileDMatrix(FeatureIter(X_train, fit, f"{prefix}_train"), nthread=n_jobs)
+            if val is not None:
+                dval = xgb.ExtMemQuantileDMatrix(FeatureIter(X_train, val, f"{prefix}_val"), ref=dtrain, nthread=n_jobs)
+        else:
+            dtrain = xgb.QuantileDMatrix(X_train if val is None else X_train[fit], nthread=n_jobs)
+            if val is not None:
+                dval = xgb.QuantileDMatrix(X_train[val], ref=dtrain, nthread=n_jobs)
+        _train_cache[(grid, method)] = (dtrain, y_train, dval, y_val)
+
+    return _train_cache[(grid, method)]
+
+def best_iterations(modelo, n_targets: int) -> List[int]:
+    """
+    Returns the last iteration kept by the booster of each of the `n_targets`
+    targets of `modelo` (the same one for every target of a native multi-target
+    booster).
+    """
+
+    if isinstance(modelo, MultiOutputRegressor):
+        return [est.get_booster().num_boosted_rounds() - 1 for est in modelo.estimators_]
+
+    return [modelo.get_booster().num_boosted_rounds() - 1] * n_targets
+
+def train_unit(grid: int, method: str, target: Optional[str], engine: str, n_jobs: int, key: str):
+    """
+    Trains the booster of the `target` parameter (or a model of every target with
+    the native engine, if `target` is None) of `grid` and `method` on the features
+    cached under `key`, using `n_jobs` threads. With early stopping, boosting stops
+    once validation error stops improving, and later trees are dropped. Returns
+    the trained booster and the training duration, or None if it can't be trained.
+    """
+
+    try:
+        dtrain, y_train, dval, y_val = quantized_rows(grid, method, key, n_jobs)
+    except Exception as e:
+        # any failure building the matrices (e.g. xgboost errors) stops the run cleanly
+        print(f"Error loading files: {e}")
+        return
+
+    if target is None:
+        model = make_model(engine, n_jobs=n_jobs)
+    else:
+        model = xgb.XGBRegressor(**XGB_PARAMS, n_jobs=n_jobs)
+        y_train, y_val = y_train[target], None if y_val is None else y_val[target]
 
     # start timer for training
     start_time_training = time.monotonic()
 
-    # train the model on the training data
+    # train the model on the shared quantized matrices, with the labels of this unit
     try:
-        print(f"Starting train...")
-        modelo = MultiOutputRegressor(xgb.XGBRegressor(learning_rate=0.02, max_depth=4, n_estimators=1000, tree_method="hist", device="cpu")).fit(X_train_scaled, y_train)
+        dtrain.set_label(y_train)
+        evals = []
+        if dval is not None:
+            dval.set_label(y_val)
+            evals = [(dval, "validation")]
+        booster = xgb.train(
+            model.get_xgb_params(),
+            dtrain,
+            num_boost_round=model.n_estimators,
+            evals=evals,
+            early_stopping_rounds=EARLY_STOPPING or None,
+            verbose_eval=False,
+        )
+        if dval is not None:
+            booster = booster[:booster.best_iteration + 1]
+        model.load_model(bytearray(booster.save_raw("ubj")))
     except Exception as e:
         print(f"Error training model: {e}")
         return
 
     # stop timer for training
-    end_time_training = time.monotonic()
-    training_duration = end_time_training - start_time_training
+    training_duration = time.monotonic() - start_time_training
+    print(f"Trained {target or 'every target'} of model {grid}_{method} in {training_duration:.1f} seconds")
+
+    return model, training_duration
+
+def assemble_model(estimators: List[xgb.XGBRegressor]) -> MultiOutputRegressor:
+    """
+    Returns a fitted `MultiOutputRegressor` made of the boosters of every target,
+    trained separately by `train_unit`, as if it had trained them itself.
+    """
+
+    model = MultiOutputRegressor(xgb.XGBRegressor(**XGB_PARAMS))
+    model.estimators_ = estimators
+    model.n_features_in_ = estimators[0].n_features_in_
+
+    return model
+
+def evaluate(grid: int, method: str, engine: str, modelo, training_duration: float, key: str):
+    """
+    Saves the trained model of `grid` and `method` and evaluates it on its training
+    data, cached under feature cache `key`.
+    """
+
     print(
         f"Training duration for model {grid}_{method}: {training_duration} seconds"
     )
 
     # save the trained model
-    model_filename = os.path.join(
-        MODELS, f"xgb_{grid}_{method}.joblib")
+    model_filename = model_file(grid, method)
     try:
         joblib.dump(modelo, model_filename)
         print(f"Model saved as {model_filename}")
@@ -105,21 +334,21 @@ def train_and_evaluate(grid: int, method: str):
         print(f"Error saving model: {e}")
         return
 
-    # predict on training data
+    # predict on training data and accumulate performance chunk by chunk
     try:
-        y_train_pred = modelo.predict(X_train_scaled)
+        X_train_scaled, y_train = scaled_rows(grid, method, key)
+        acc = MetricsAccumulator(y_train.shape[1])
+        for i in range(0, len(X_train_scaled), CHUNK_ROWS):
+            y_train_pred = modelo.predict(X_train_scaled[i:i + CHUNK_ROWS])
+            acc.update(y_train.iloc[i:i + CHUNK_ROWS], y_train_pred)
     except Exception as e:
         print(f"Error predicting on training data: {e}")
         return
 
     # performance on training data
-    try:
-        r2_train = r2_score(y_train, y_train_pred)
-        mae_train = mean_absolute_error(y_train, y_train_pred)
-        mape_train = mean_absolute_percentage_error(y_train, y_train_pred)
-    except Exception as e:
-        print(f"Error calculating performance metrics: {e}")
-        return
+    r2_train, mae_train, mape_train = acc.r2(), acc.mae(), acc.mape()
+    params_df = acc.breakdown(y_train.columns, name="parameter")
+    params_df["best_iteration"] = best_iterations(modelo, y_train.shape[1])
 
     print(f"R-squared on Train Data for {grid}_{method}: {r2_train}")
     print(f"MAE on Train Data for {grid}_{method}: {mae_train}")
@@ -128,10 +357,14 @@ def train_and_evaluate(grid: int, method: str):
     return {
         "grid": grid,
         "method": method,
+        "engine": engine,
+        "multi_strategy": MULTI_STRATEGY if engine == "native" else "",
         "r2": r2_train,
         "mae": mae_train,
         "mape": mape_train,
-        "training_duration": training_duration
+        "best_iteration": params_df["best_iteration"].max(),
+        "training_duration": training_duration,
+        "parameters": params_df,
     }
 
 def main():
@@ -143,20 +376,75 @@ def main():
     start_time = time.time()
 
     # checking for previous data files
-    if os.path.exists(METRICS):
-        os.remove(METRICS)
+    for metrics_file in (METRICS, PARAM_METRICS):
+        if os.path.exists(metrics_file):
+            os.remove(metrics_file)
 
-    # iterate over the main folder numbers and subfolder numbers to train and evaluate models
+    # drop features and external memory pages left by crashed runs
+    feature_cache.evict()
+
+    # scale and cache features first, so every unit of a model trains on them
+    keys = {}
     for grid in GRIDS:
         for method in METHODS:
-            result = train_and_evaluate(grid, method)
-            if result == None:  # ensure result is not None
+            keys[(grid, method)] = prepare_features(grid, method)
+            if keys[(grid, method)] is None:
                 return 1
-            # save results
-            result_df = pd.DataFrame([result])
-            write_header = not os.path.exists(METRICS)
-            result_df.to_csv(METRICS, mode="a", header=write_header, index=False)
-            print(f"Training performance metrics saved to {METRICS}")
+
+    # split the core budget between workers, so boosters don't oversubscribe cores
+    cores = CORES or os.cpu_count()
+    workers = max(1, min(WORKERS, cores))
+    n_jobs = max(1, cores // workers)
+
+    # units of every target with the separate engine, or of every model with the native one
+    targets = list(pd.read_csv(Y_DATA, nrows=0).columns) if ENGINE == "separate" else [None]
+    jobs = [
+        (grid, method, target, ENGINE, n_jobs, keys[(grid, method)])
+        for grid in sorted(GRIDS, reverse=True)  # largest grids first, so they don't finish last
+        for method in METHODS
+        for target in targets
+    ]
+    print(f"Training {len(jobs)} units in {workers} workers of {n_jobs} threads")
+
+    trained = {}
+
+    def save_result(job: tuple, result: tuple) -> bool:
+        # evaluate every model once all of its units are trained
+        grid, method, target = job[:3]
+        units = trained.setdefault((grid, method), {})
+        units[target] = result
+        if len(units) < len(targets):
+            return True
+        del trained[(grid, method)]
+
+        # every unit of the model is trained, so free its quantized matrices (held here
+        # when units run in this process) before evaluating
+        _train_cache.clear()
+
+        if ENGINE == "separate":
+            modelo = assemble_model([units[target][0] for target in targets])
+        else:
+            modelo = units[None][0]
+        result = evaluate(grid, method, ENGINE, modelo, sum(duration for _, duration in units.values()), keys[(grid, method)])
+        if result is None:
+            return False
+
+        # save results, with the breakdown by predicted parameter apart
+        params_df = result.pop("parameters")
+        params_df.insert(0, "method", method)
+        params_df.insert(0, "grid", grid)
+        result_df = pd.DataFrame([result])
+        for df, metrics_file in ((result_df, METRICS), (params_df, PARAM_METRICS)):
+            write_header = not os.path.exists(metrics_file)
+            df.to_csv(metrics_file, mode="a", header=write_header, index=False)
+        print(f"Training performance metrics saved to {METRICS} and {PARAM_METRICS}")
+
+        return True
+
+    status = run_jobs(train_unit, jobs, save_result, workers=workers, blas_threads=n_jobs)
+    _train_cache.clear()
+    if not status:
+        return 1
 
     # end the timer and calculate elapsed time in minutes and seconds
     end_time = time.time()
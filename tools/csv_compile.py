@@ -1,14 +1,26 @@
 """
 Tool to compile csv files.
+Run from the repository root with `python -m tools.csv_compile`.
+
+Raw files are parsed by a pool of worker processes (`[Parallel] workers`) straight
+into the x dataset, and their DoE parameters are saved as numbers to the y file.
+A manifest records the size, modification time and content hash of every compiled
+file, so reruns only append new or changed files and drop deleted ones. Rows are
+then in compile order rather than file name order, so a dataset compiled
+incrementally holds the same rows as a fresh compile, in another order (which the
+data filter doesn't depend on).
 """
 
 import configparser
 import glob
 import os
-import csv
+import numpy as np
 import pandas as pd
-import re
 import time
+from src import datastore, ingest
+from src.dedup import Deduplicator
+from src.executor import run_jobs
+from src.ingest import PARAMS, ingest_files
 
 # Reading configuration file
 config = configparser.ConfigParser()
@@ -18,62 +30,156 @@ config.read(r"config/config.ini")
 MYCSVDIR = config.get("Paths", "data_raw")
 X_CRUCIFORM = config.get("Files", "x_compiled")
 Y_CRUCIFORM = config.get("Files", "y_compiled")
-X_BUFF_TSHOLD = 100
-
-# Start the timer
-start_time = time.time()
-
-# Get all the csv files in that directory (assuming they have the extension .csv)
-csvfiles = glob.glob(os.path.join(MYCSVDIR, "*.csv"))
-total_files = len(csvfiles)
-
-# Checking for previous data files
-if os.path.isfile(X_CRUCIFORM):
-    os.remove(X_CRUCIFORM)
-if os.path.isfile(Y_CRUCIFORM):
-    os.remove(Y_CRUCIFORM)
-
-final_rows = []
-final_y = []
-
-for index, cs in enumerate(csvfiles, start=1):
-    rows = []
-    with open(cs, "r") as file:
-        csvreader = csv.reader(file)
-        for row in csvreader:
-            rows.append(row)
-    rows = [x for f in rows for x in f]
-    final_rows.append(rows)
-    final_y.append(re.findall(r"\d+(?:\.\d+)?", cs))
-
-    # Print progress
-    print(f"Processed {index}/{total_files} files")
-
-    # If buffer x file has more than X_BUFF_TSHOLD lines, it is dumped
-    if len(final_rows) == X_BUFF_TSHOLD:
+MESH_FILES = {os.path.abspath(config.get("Files", f, fallback=f)) for f in ("centroids", "elements", "nodes")}
+FILES_PER_JOB = 50
+
+def previous_compile():
+    """
+    Returns the manifest entries and y data of the previous compile, or None if
+    there is none or it doesn't match the x dataset.
+    """
+    entries = ingest.load_manifest(X_CRUCIFORM)
+    if entries is None or not datastore.exists(X_CRUCIFORM) or not os.path.isfile(Y_CRUCIFORM):
+        return None
+    y = pd.read_csv(Y_CRUCIFORM, index_col=0)
+    n_compiled = sum(entry["compiled"] for entry in entries)
+    if n_compiled != datastore.n_rows(X_CRUCIFORM) or len(y) != n_compiled:
+        return None
+    return entries, y[PARAMS].to_numpy(dtype=float)
+
+def main():
+    """
+    Main function to start code execution.
+    """
+
+    # Start the timer
+    start_time = time.time()
+
+    # Get all the csv files in that directory (assuming they have the extension .csv)
+    # Mesh files may share the folder, and are skipped with any file not named after DoE parameters
+    csvfiles = [
+        f for f in sorted(glob.glob(os.path.join(MYCSVDIR, "*.csv")))
+        if os.path.abspath(f) not in MESH_FILES
+    ]
+    skipped = [f for f in csvfiles if not ingest.is_simulation_file(f)]
+    if skipped:
+        print(f"WARNING: skipping {len(skipped)} files not named after simulation parameters, e.g. {skipped[0]}")
+        csvfiles = [f for f in csvfiles if f not in set(skipped)]
+    total_files = len(csvfiles)
+    dedup = Deduplicator(X_CRUCIFORM)
+
+    previous = previous_compile()
+    if previous is None:
+        if total_files == 0:
+            print(f"No csv files found in {MYCSVDIR}")
+            return 1
+
+        # Checking for previous data files, and forgetting the simulations seen in them
+        print("Compiling every file")
+        datastore.remove(X_CRUCIFORM)
+        if os.path.isfile(Y_CRUCIFORM):
+            os.remove(Y_CRUCIFORM)
+        dedup.clear()
+
+        # Dataset width is set by the timestep size of the first file
+        first = np.loadtxt(csvfiles[0], delimiter=",", ndmin=2)
+        n_cols = datastore.N_TIMESTEPS * first.shape[1]
+        datastore.create(X_CRUCIFORM, datastore.n_points_of(n_cols))
+        entries, params = [], np.empty((0, len(PARAMS)))
+    else:
+        entries, params = previous
+
+    # Compare files with the manifest: unchanged files are kept, changed and deleted ones dropped
+    kept_entries, dropped = [], []
+    for entry in entries:
+        try:
+            st = os.stat(entry["path"])
+        except FileNotFoundError:
+            dropped.append(entry)
+            continue
+        if (st.st_size, st.st_mtime_ns) != (entry["size"], entry["mtime_ns"]):
+            if st.st_size != entry["size"] or ingest.file_hash(entry["path"]) != entry["hash"]:
+                dropped.append(entry)
+                continue
+            entry["mtime_ns"] = st.st_mtime_ns
+        kept_entries.append(entry)
+
+    # Duplicates of dropped files may now be compiled, so they are checked again
+    if dropped:
+        kept_entries = [entry for entry in kept_entries if entry["compiled"]]
+    known = {entry["path"] for entry in kept_entries}
+    new_files = [cs for cs in csvfiles if cs not in known]
+    print(f"{len(new_files)} new or changed files, {len(dropped)} changed or deleted files to drop")
+
+    # Rows of dropped files are removed, and the seen simulations indexed again from the rest
+    if dropped:
+        keep = np.array([entry not in dropped for entry in entries if entry["compiled"]], dtype=bool)
+        datastore.compact(X_CRUCIFORM, keep)
+        params = params[keep]
+        dedup.clear()
+        dedup.admit(datastore.load_keys(X_CRUCIFORM), params)
+    entries = kept_entries
+
+    # New files are parsed in parallel, each job writing its own rows after the existing ones
+    start = datastore.extend(X_CRUCIFORM, len(new_files))
+    new_params = np.full((len(new_files), len(PARAMS)), np.nan)
+    hashes = [None] * len(new_files)
+    processed = 0
+
+    def save_params(job, result):
+        nonlocal processed
+        i = job[1] - start
+        for j, (file_params, file_hash) in enumerate(result):
+            new_params[i + j] = file_params
+            hashes[i + j] = file_hash
+        processed += len(result)
+
         # Print progress
-        print(f"Dumping x buffer file")
-        p = pd.DataFrame(final_rows)
-        p.to_csv(X_CRUCIFORM, mode="a", header=False, index=False)
-        final_rows = []
-
-print("Dataframe x and y data")
-p = pd.DataFrame(final_rows)
-pf = pd.DataFrame(final_y, columns=["F", "G", "H", "L", "M", "N", "sigma0", "k", "n"])
-
-print("Writting final x and y data")
-p.to_csv(X_CRUCIFORM, mode="a", header=False, index=False)
-pf.to_csv(Y_CRUCIFORM)
-
-# End the timer and calculate elapsed time
-end_time = time.time()
-elapsed_time = end_time - start_time
-
-# Convert elapsed time to minutes and seconds
-elapsed_minutes = int(elapsed_time // 60)
-elapsed_seconds = int(elapsed_time % 60)
-
-# Print total elapsed time in "minutes:seconds" format
-print(
-    f"Finished processing {total_files} files in {elapsed_minutes}:{elapsed_seconds:02d} minutes."
-)
+        print(f"Processed {processed}/{len(new_files)} files")
+
+    jobs = [
+        (new_files[i:i + FILES_PER_JOB], start + i, X_CRUCIFORM)
+        for i in range(0, len(new_files), FILES_PER_JOB)
+    ]
+    if not run_jobs(ingest_files, jobs, save_params):
+        datastore.truncate(X_CRUCIFORM, start)
+        return 1
+
+    # Duplicated simulations (same data or, optionally, same DoE parameters) are rejected
+    new_keep = dedup.admit(datastore.load_keys(X_CRUCIFORM)[start:], new_params)
+    for cs in np.array(new_files)[~new_keep]:
+        print(f"Skipping duplicated simulation {cs}")
+    datastore.compact(X_CRUCIFORM, np.concatenate([np.ones(start, dtype=bool), new_keep]))
+
+    for cs, file_hash, compiled in zip(new_files, hashes, new_keep):
+        st = os.stat(cs)
+        entries.append({
+            "path": cs,
+            "size": st.st_size,
+            "mtime_ns": st.st_mtime_ns,
+            "hash": file_hash,
+            "compiled": bool(compiled),
+        })
+
+    print("Writting final y data")
+    pf = pd.DataFrame(np.vstack([params, new_params[new_keep]]), columns=PARAMS)
+    pf.to_csv(Y_CRUCIFORM)
+    ingest.save_manifest(X_CRUCIFORM, entries)
+
+    # End the timer and calculate elapsed time
+    end_time = time.time()
+    elapsed_time = end_time - start_time
+
+    # Convert elapsed time to minutes and seconds
+    elapsed_minutes = int(elapsed_time // 60)
+    elapsed_seconds = int(elapsed_time % 60)
+
+    # Print total elapsed time in "minutes:seconds" format
+    print(
+        f"Finished processing {len(new_files)} files ({int((~new_keep).sum())} duplicates skipped) in {elapsed_minutes}:{elapsed_seconds:02d} minutes."
+    )
+
+    return 0
+
+if __name__ == "__main__":
+    exit(main())
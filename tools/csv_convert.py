@@ -0,0 +1,124 @@
+"""
+Tool to convert wide simulation csv files to binary datasets.
+Run from the repository root with `python -m tools.csv_convert`.
+
+The compiled x data of an older version is converted together with a manifest of
+the raw files it was compiled from, so the next `tools.csv_compile` run only
+processes new or changed raw files. The manifest is only written if every row
+still matches a raw file (found by the DoE parameters of the y data, with the same
+values); otherwise the next compile replaces the converted data.
+"""
+
+import configparser
+import glob
+import os
+import time
+import numpy as np
+import pandas as pd
+from src import datastore, ingest
+from src.dedup import Deduplicator
+from src.ingest import PARAMS
+
+# Reading configuration file
+config = configparser.ConfigParser()
+config.read(r"config/config.ini")
+
+# Accessing variables
+MYCSVDIR = config.get("Paths", "data_raw")
+DATA = config.get("Paths", "data_cleaned")
+X_CRUCIFORM = config.get("Files", "x_compiled")
+Y_CRUCIFORM = config.get("Files", "y_compiled")
+
+def migrate_manifest():
+    """
+    Writes the manifest of the converted compiled data, matching each of its rows to
+    the raw file with the DoE parameters of the same y row. Returns a reason why
+    the manifest can't be written, or None.
+    """
+
+    if not os.path.isfile(Y_CRUCIFORM):
+        return f"{Y_CRUCIFORM} is missing"
+    y = pd.read_csv(Y_CRUCIFORM, index_col=0, float_precision="round_trip")
+    n_rows = datastore.n_rows(X_CRUCIFORM)
+    if list(y.columns) != PARAMS or len(y) != n_rows:
+        return f"{Y_CRUCIFORM} doesn't hold the DoE parameters of every row"
+
+    # Raw files by DoE parameters, which must identify a single file
+    files = {}
+    for cs in glob.glob(os.path.join(MYCSVDIR, "*.csv")):
+        if ingest.is_simulation_file(cs):
+            files.setdefault(tuple(ingest.doe_params(cs)), []).append(cs)
+    params = y.to_numpy(dtype=float)
+    paths = [files.get(tuple(p), []) for p in params]
+    if any(len(p) != 1 for p in paths):
+        return "some rows don't match a single raw file"
+    paths = [p[0] for p in paths]
+
+    # Rows must hold the current values of their files
+    keys = datastore.load_keys(X_CRUCIFORM)
+    n_cols = datastore.read_schema(X_CRUCIFORM)["n_cols"]
+    for cs, key in zip(paths, keys):
+        if not np.array_equal(datastore.row_keys(ingest.read_simulation(cs, n_cols)[None, :])[0], key):
+            return f"{cs} changed since it was compiled"
+
+    # Older compiles kept duplicated simulations, which compiles now reject
+    dedup = Deduplicator(X_CRUCIFORM)
+    dedup.clear()
+    if not dedup.admit(keys, params).all():
+        dedup.clear()
+        return "it holds duplicated simulations"
+
+    entries = []
+    for cs in paths:
+        st = os.stat(cs)
+        entries.append({
+            "path": cs,
+            "size": st.st_size,
+            "mtime_ns": st.st_mtime_ns,
+            "hash": ingest.file_hash(cs),
+            "compiled": True,
+        })
+    ingest.save_manifest(X_CRUCIFORM, entries)
+
+    return None
+
+# Start the timer
+start_time = time.time()
+
+# Train/test files of older runs are never read, as splits are now row indices over x_data
+legacy = sorted(glob.glob(os.path.join(DATA, "x_train*.csv")) + glob.glob(os.path.join(DATA, "x_test*.csv")))
+if legacy:
+    print(
+        f"Skipping {len(legacy)} legacy x_train/x_test files: re-run data_filter and interpolation "
+        f"to produce x_data and splits.npz"
+    )
+
+# Compiled data
+if not os.path.isfile(X_CRUCIFORM):
+    print(f"Skipping missing file {X_CRUCIFORM}")
+else:
+    rows = datastore.convert_csv(X_CRUCIFORM)
+    bin_file, _ = datastore.store_files(X_CRUCIFORM)
+    print(
+        f"Converted {X_CRUCIFORM} ({rows} rows): "
+        f"{os.path.getsize(X_CRUCIFORM) / 1024**2:.1f} MB -> {os.path.getsize(bin_file) / 1024**2:.1f} MB"
+    )
+
+    reason = migrate_manifest()
+    if reason is None:
+        print(f"Manifest saved to {ingest.manifest_file(X_CRUCIFORM)}, the next compile only processes new or changed files")
+    else:
+        if os.path.isfile(ingest.manifest_file(X_CRUCIFORM)):
+            os.remove(ingest.manifest_file(X_CRUCIFORM))
+        print(f"WARNING: no manifest saved, as {reason}: the next compile will replace {X_CRUCIFORM}")
+
+# End the timer and calculate elapsed time
+end_time = time.time()
+elapsed_time = end_time - start_time
+
+# Convert elapsed time to minutes and seconds
+elapsed_minutes = int(elapsed_time // 60)
+elapsed_seconds = int(elapsed_time % 60)
+
+# Print total elapsed time in "minutes:seconds" format
+print(f"Finished in {elapsed_minutes}:{elapsed_seconds:02d} minutes.")
@@ -1,12 +1,19 @@
 """
 Tool to check differences between manually calculated integration points and abaqus centroids.
+
+Points are matched to their nearest centroid with a KD-tree, so both files may list
+them in any order. Integration points further than `tolerance` from every centroid
+(or sharing their nearest centroid with a closer point) are flagged as unmatched,
+as are centroids left without an integration point. The distance of every point to
+its nearest centroid is saved to a `_diff.csv` companion of the integration points.
 """
 
 import configparser
-import csv
-import numpy as np
-from sklearn import metrics
+import os
 import time
+import numpy as np
+import pandas as pd
+from src.geometry import match_points
 
 # Reading configuration file
 config = configparser.ConfigParser()
@@ -16,27 +23,47 @@ config.read(r"config/config.ini")
 MYCSVDIR = config.get("Paths", "data_raw")
 INTP = config.get("Files", "integration_points")
 CENT = config.get("Files", "centroids")
+TOLERANCE = config.getfloat("Diff", "tolerance", fallback=1e-6)
+DIFF = f"{os.path.splitext(INTP)[0]}_diff.csv"
 
 # Start the timer
 start_time = time.time()
 
-with open(INTP, 'r') as f_intp, open(CENT, 'r') as f_cent:
-    f_intp_r = csv.reader(f_intp)
-    f_cent_r = csv.reader(f_cent)
-    intp_data = []
-    cent_data = []
-    diff_data = []
-
-    for row_intp, row_cent in zip(f_intp_r, f_cent_r):
-        for intp, cent in zip(row_intp, row_cent):
-            intp_data.append(float(intp))
-            cent_data.append(float(cent))
-            diff_data.append(float(intp)-float(cent))
-
-print(f"Max diff value: {max(diff_data)}")
-print(f"Mean diff value: {np.mean(diff_data)}")
-print(f"MAE: {metrics.mean_absolute_error(cent_data, intp_data)}")
-print(f"MAPE: {metrics.mean_absolute_percentage_error(cent_data, intp_data)}")
+intp_data = np.loadtxt(INTP, delimiter=",", ndmin=2)
+cent_data = np.loadtxt(CENT, delimiter=",", ndmin=2)
+
+# Comparing the coordinates both files have (centroids may be 2D)
+n_dims = min(intp_data.shape[1], cent_data.shape[1])
+intp_data, cent_data = intp_data[:, :n_dims], cent_data[:, :n_dims]
+
+idx, dist, matched = match_points(intp_data, cent_data, TOLERANCE)
+unmatched_cent = np.setdiff1d(np.arange(len(cent_data)), idx[matched])
+diff_data = intp_data[matched] - cent_data[idx[matched]]
+
+print(f"Integration points: {len(intp_data)}, centroids: {len(cent_data)}")
+print(f"Max distance: {dist.max()}")
+print(f"Mean distance: {dist.mean()}")
+for q, value in zip([50, 95, 99], np.percentile(dist, [50, 95, 99])):
+    print(f"{q}th percentile distance: {value}")
+if matched.any():
+    print(f"Max diff value: {np.abs(diff_data).max()}")
+    print(f"MAE: {np.abs(diff_data).mean()}")
+print(f"Matched points within {TOLERANCE}: {int(matched.sum())}")
+
+if not matched.all() or len(unmatched_cent):
+    print(f"WARNING: {int((~matched).sum())} integration points and {len(unmatched_cent)} centroids are unmatched")
+    for i in np.flatnonzero(~matched)[:10]:
+        print(f"  integration point {i + 1} {intp_data[i]}: nearest centroid {idx[i] + 1} at {dist[i]}")
+    for i in unmatched_cent[:10]:
+        print(f"  centroid {i + 1} {cent_data[i]}")
+
+pd.DataFrame({
+    "point": np.arange(1, len(intp_data) + 1),
+    "centroid": idx + 1,
+    "distance": dist,
+    "matched": matched,
+}).to_csv(DIFF, index=False)
+print(f"Distances saved to {DIFF}")
 
 # End the timer and calculate elapsed time
 end_time = time.time()
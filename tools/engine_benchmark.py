@@ -0,0 +1,79 @@
+"""
+Tool to benchmark the training engines of `src.training` against each other, for
+wall time and accuracy on the test split. Run from the repository root with
+`python -m tools.engine_benchmark`.
+
+Models are trained with the same hyperparameters as `src.training`, but are not
+saved, so benchmarking doesn't replace the models used by testing.
+"""
+
+import os
+import time
+import pandas as pd
+from sklearn.preprocessing import StandardScaler
+from src.metrics import MetricsAccumulator
+from src import training
+
+# Accessing variables
+BENCHMARK = f"{os.path.splitext(training.METRICS)[0]}_engines.csv"
+
+# grids, methods and (engine, multi_strategy) pairs to benchmark
+GRIDS = [20]
+METHODS = ["linear"]
+ENGINES = [
+    ("separate", None),
+    ("native", "one_output_per_tree"),
+    ("native", "multi_output_tree"),
+]
+
+# Start the timer
+start_time = time.time()
+
+results = []
+for grid in GRIDS:
+    for method in METHODS:
+        X_train, y_train = training.load_rows(grid, method, "train")
+        X_test, y_test = training.load_rows(grid, method, "test")
+        scaler = StandardScaler().fit(X_train)
+        X_train_scaled, X_test_scaled = scaler.transform(X_train), scaler.transform(X_test)
+
+        for engine, multi_strategy in ENGINES:
+            fit_start = time.monotonic()
+            model = training.make_model(engine, multi_strategy).fit(X_train_scaled, y_train)
+            fit_time = time.monotonic() - fit_start
+
+            predict_start = time.monotonic()
+            acc = MetricsAccumulator(y_test.shape[1])
+            for i in range(0, len(X_test_scaled), training.CHUNK_ROWS):
+                acc.update(y_test.iloc[i:i + training.CHUNK_ROWS], model.predict(X_test_scaled[i:i + training.CHUNK_ROWS]))
+            predict_time = time.monotonic() - predict_start
+
+            results.append({
+                "grid": grid,
+                "method": method,
+                "engine": engine,
+                "multi_strategy": multi_strategy or "",
+                "r2": acc.r2(),
+                "mae": acc.mae(),
+                "mape": acc.mape(),
+                "training_duration": fit_time,
+                "testing_duration": predict_time,
+            })
+            print(
+                f"{engine} engine ({multi_strategy or 'per target'}) for {grid}_{method}: "
+                f"R-squared {acc.r2():.6f}, MAE {acc.mae():.6f}, trained in {fit_time:.1f} s"
+            )
+
+pd.DataFrame(results).to_csv(BENCHMARK, index=False)
+print(f"Benchmark saved to {BENCHMARK}")
+
+# End the timer and calculate elapsed time
+end_time = time.time()
+elapsed_time = end_time - start_time
+
+# Convert elapsed time to minutes and seconds
+elapsed_minutes = int(elapsed_time // 60)
+elapsed_seconds = int(elapsed_time % 60)
+
+# Print total elapsed time in "minutes:seconds" format
+print(f"Finished in {elapsed_minutes}:{elapsed_seconds:02d} minutes.")
@@ -1,11 +1,17 @@
 """
 Tool to calculate integration points for C3D8R elements using nodes.
+
+The integration point of each element is the centroid of its nodes in the first
+frame of `nodes.csv`. If `nodes.csv` holds one row of deformed coordinates per
+frame, the integration points of every frame are also saved to a `_frames.csv`
+companion file, with one row of frame, element and x,y,z values per point.
 """
 
 import configparser
 import os
 import csv
 import time
+from src.geometry import load_elements, load_nodes, element_centroids
 
 # Reading configuration file
 config = configparser.ConfigParser()
@@ -16,38 +22,30 @@ MYCSVDIR = config.get("Paths", "data_raw")
 EL = config.get("Files", "elements")
 ND = config.get("Files", "nodes")
 INT_P = config.get("Files", "integration_points")
+INT_P_FRAMES = f"{os.path.splitext(INT_P)[0]}_frames.csv"
 
 # Start the timer
 start_time = time.time()
 
 # Checking for previous data files
-if os.path.isfile(INT_P):
-    os.remove(INT_P)
-
-with open(EL, 'r') as f_elem, open(ND, 'r') as f_nodes, open(INT_P, 'w') as f_intp:
-    f_elem_r = csv.reader(f_elem)
-    f_nodes_r = csv.reader(f_nodes)
-    f_intp_w = csv.writer(f_intp)
-    coords = []
-    n_row = next(f_nodes_r)
-
-    for element in f_elem_r:
-        el_coords = []
-        el_x = []
-        el_y = []
-        el_z = []
-        for node in element:
-            el_x.append(float(n_row[(int(node)-1)*3]))
-            el_y.append(float(n_row[(int(node)-1)*3+1]))
-            el_z.append(float(n_row[(int(node)-1)*3+2]))
-
-        x_val = sum(el_x)/len(el_x)
-        y_val = sum(el_y)/len(el_y)
-        z_val = sum(el_z)/len(el_z)
-        el_coords.extend([x_val, y_val, z_val])
-        coords.append(el_coords)
-    
-    f_intp_w.writerows(coords)
+for file in [INT_P, INT_P_FRAMES]:
+    if os.path.isfile(file):
+        os.remove(file)
+
+elements = load_elements(EL)
+nodes = load_nodes(ND)
+coords = element_centroids(elements, nodes)
+
+with open(INT_P, 'w', newline='') as f_intp:
+    csv.writer(f_intp).writerows(coords[0].tolist())
+
+if len(coords) > 1:
+    with open(INT_P_FRAMES, 'w', newline='') as f_frames:
+        f_frames_w = csv.writer(f_frames)
+        f_frames_w.writerow(["frame", "element", "x", "y", "z"])
+        for frame, frame_coords in enumerate(coords.tolist()):
+            f_frames_w.writerows([frame, el, *xyz] for el, xyz in enumerate(frame_coords, start=1))
+print(f"Integration points of {coords.shape[1]} elements in {len(coords)} frames saved to {INT_P}")
 
 
 # End the timer and calculate elapsed time
@@ -1,8 +1,15 @@
+"""
+Tool to plot interpolated against original strains.
+Run from the repository root with `python -m tools.inter_plots`.
+"""
+
 import numpy as np
 import configparser
 import csv
 import os
 import matplotlib.pyplot as plt
+from src.dataset import open_dataset
+from src import splits
 
 # Reading configuration file
 config = configparser.ConfigParser()
@@ -11,7 +18,7 @@ config.read(r"config/config.ini")
 # Accessing variables
 DATA = config.get("Paths", "data_cleaned")
 INT_P = config.get("Files", "centroids")
-X_TRAIN = config.get("Files", "x_train")
+X_DATA = config.get("Files", "x_data")
 PLOT = config.get("Paths", "resources")
 
 GRIDS = [20, 30, 40]
@@ -84,20 +91,12 @@ x_centroids = np.array(x_centroids)
 y_centroids = np.array(y_centroids)
 
 # Original exx, eyy and exy values
-x_ori_exx = []
-x_ori_eyy = []
-x_ori_exy = []
-with open(X_TRAIN, 'r') as file:
-    reader = csv.reader(file)
-    header = next(reader)
-    row = next(reader)
-    for i in range(len(row) - (int(len(row) / 20) - 2), len(row), 3):
-        x_ori_exx.append(float(row[i]))
-        x_ori_eyy.append(float(row[i+1]))
-        x_ori_exy.append(float(row[i+2]))
-x_ori_exx = np.array(x_ori_exx)
-x_ori_eyy = np.array(x_ori_eyy)
-x_ori_exy = np.array(x_ori_exy)
+# (last timestep of first training simulation, only these values are read from disk)
+sim = splits.load_split()[0][0]
+strain = np.array(open_dataset(X_DATA).strain[sim, -1])
+x_ori_exx = strain[:, 0]
+x_ori_eyy = strain[:, 1]
+x_ori_exy = strain[:, 2]
 
 # Determine global color scale
 global_min, global_max = x_ori_exx.min(), x_ori_exx.max()
@@ -106,23 +105,13 @@ global_min, global_max = x_ori_exx.min(), x_ori_exx.max()
 for grid in GRIDS:
     x_coords, y_coords = mesh_gen(grid)
     for method in METHODS:
-        interpolated_file = f"x_train_{grid}_{method}.csv"
+        interpolated_file = f"x_data_{grid}_{method}"
 
         # Interpolated exx, eyy and exy values
-        x_int_exx = []
-        x_int_eyy = []
-        x_int_exy = []
-        with open(os.path.join(DATA, interpolated_file), 'r') as file:
-            reader = csv.reader(file)
-            header = next(reader)
-            row = next(reader)
-            for i in range(len(row) - (int(len(row) / 20) - 2), len(row), 3):
-                x_int_exx.append(float(row[i]))
-                x_int_eyy.append(float(row[i+1]))
-                x_int_exy.append(float(row[i+2]))
-        x_int_exx = np.array(x_int_exx)
-        x_int_eyy = np.array(x_int_eyy)
-        x_int_exy = np.array(x_int_exy)
+        strain = np.array(open_dataset(os.path.join(DATA, interpolated_file)).strain[sim, -1])
+        x_int_exx = strain[:, 0]
+        x_int_eyy = strain[:, 1]
+        x_int_exy = strain[:, 2]
 
         # Update global color scale
         global_min = min(global_min, np.nanmin(x_int_exx))
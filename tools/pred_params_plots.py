@@ -4,6 +4,7 @@ import configparser
 import os
 import matplotlib.pyplot as plt
 from sklearn.metrics import r2_score
+from src import splits
 
 # Reading configuration file
 config = configparser.ConfigParser()
@@ -11,7 +12,7 @@ config.read(r"config/config.ini")
 
 # Folder paths from config
 DATA = config.get("Paths", "data_cleaned")
-Y_TEST = config.get("Files", "y_test")
+Y_DATA = config.get("Files", "y_data")
 PLOT = config.get("Paths", "resources")
 
 # Paths and configurations (modify as needed)
@@ -43,7 +44,7 @@ def generate_comparison_plots(grid, method, test_method):
     # File paths for the predicted and original y data
     pred_params_path = os.path.join(DATA, f"y_pred_{grid}_{method}_{test_method}.csv")
     pred_params_ori_path = os.path.join(DATA, f"y_pred_ori.csv")
-    y_test_path = Y_TEST  # Original test data
+    y_test_path = Y_DATA  # Original data, of which test rows are used
 
     try:
         # Load files with headers
@@ -55,6 +56,8 @@ def generate_comparison_plots(grid, method, test_method):
         
         print(f"Loading original data from {y_test_path}")
         y_test = pd.read_csv(y_test_path, header=0)  # Load with header
+        _, test = splits.load_split(n_rows=len(y_test))
+        y_test = y_test.iloc[test].reset_index(drop=True)
         
         # Replace the header of y_pred with the correct header from y_test
         y_pred.columns = y_test.columns
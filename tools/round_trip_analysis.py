@@ -0,0 +1,126 @@
+"""
+Tool to analyse the centroids -> grid -> centroids round trip of every grid and
+method through its composite operator, without any reverse interpolation pass.
+Run from the repository root with `python -m tools.round_trip_analysis`.
+
+For each centroid, the amplification is the sum of absolute weights of its row of
+the composite operator (a bound on the ratio between the round trip value and the
+largest input value), and the error bound is the same sum for the operator minus
+the identity (a bound on the round trip error, relative to the largest input
+value). Exact reverse interpolation metrics are obtained by applying the composite
+operator to the training rows of `x_data` with one matrix product per block of
+simulations.
+"""
+
+import numpy as np
+import configparser
+import csv
+import os
+import time
+import pandas as pd
+from scipy import sparse
+from scipy.sparse.linalg import svds
+from src.mesh_interp import round_trip_operator
+from src.dataset import split_timesteps, join_timesteps
+from src.metrics import MetricsAccumulator
+from src.rbf_operator import apply_operator
+from src import datastore, splits
+
+# Reading configuration file
+config = configparser.ConfigParser()
+config.read(r"config/config.ini")
+
+# Accessing variables
+INT_P = config.get("Files", "centroids")
+X_DATA = config.get("Files", "x_data")
+RT_METRICS = config.get("Files", "round_trip_metrics")
+RT_CENTROIDS = f"{os.path.splitext(RT_METRICS)[0]}_centroids.csv"
+
+# grids and methods to screen
+GRIDS = [20, 30, 40]
+METHODS = ["linear", "cubic", "multiquadric"]
+BLOCK = 500
+
+# Start the timer
+start_time = time.time()
+
+# Importing x,y centroids coordinates into arrays
+with open(INT_P, 'r') as file:
+    coords = np.array([row[:2] for row in csv.reader(file)], dtype=float)
+x, y = coords[:, 0], coords[:, 1]
+train, _ = splits.load_split(n_rows=datastore.n_rows(X_DATA))
+
+summary, centroids = [], []
+for grid in GRIDS:
+    for method in METHODS:
+        op_start = time.time()
+        op = round_trip_operator(grid, method, x, y)
+        if sparse.issparse(op):
+            # local operators stay sparse, so refined meshes never build n x n matrices
+            err_op = (op - sparse.identity(len(x), format="csr")).tocsr()
+            amplification = np.asarray(abs(op).sum(axis=1)).ravel()
+            error_bound = np.asarray(abs(err_op).sum(axis=1)).ravel()
+            spectral_norm = svds(err_op, k=1, return_singular_vectors=False)[0]
+        else:
+            err_op = op - np.eye(len(x))
+            amplification = np.abs(op).sum(axis=1)
+            error_bound = np.abs(err_op).sum(axis=1)
+            spectral_norm = np.linalg.norm(err_op, 2)
+        op_time = time.time() - op_start
+
+        # exact reverse interpolation metrics on the training data
+        apply_start = time.time()
+        acc = MetricsAccumulator(datastore.read_schema(X_DATA)["n_cols"])
+        for block in datastore.iter_rows(X_DATA, train, BLOCK):
+            forces, strains = split_timesteps(block)
+            acc.update(block, join_timesteps(forces, np.nan_to_num(apply_operator(op, strains))))
+        apply_time = time.time() - apply_start
+
+        # observed mean absolute error of each centroid, over timesteps and components
+        _, col_mae = split_timesteps((acc.sae / max(acc.n, 1))[None, :])
+        point_mae = col_mae[0].mean(axis=(0, 2))
+
+        summary.append({
+            "grid": grid,
+            "method": method,
+            "r2": acc.r2(),
+            "mae": acc.mae(),
+            "mape": acc.mape(),
+            "max_amplification": amplification.max(),
+            "mean_amplification": amplification.mean(),
+            "max_error_bound": error_bound.max(),
+            "mean_error_bound": error_bound.mean(),
+            "spectral_error_norm": spectral_norm,
+            "operator_duration": op_time,
+            "metrics_duration": apply_time,
+        })
+        centroids.append(pd.DataFrame({
+            "grid": grid,
+            "method": method,
+            "centroid": np.arange(1, len(x) + 1),
+            "x": x,
+            "y": y,
+            "amplification": amplification,
+            "error_bound": error_bound,
+            "mae": point_mae,
+        }))
+        print(
+            f"{method} method for {grid} grid: R-squared {acc.r2():.6f}, "
+            f"max amplification {amplification.max():.4f}, max error bound {error_bound.max():.4f} "
+            f"({op_time + apply_time:.1f} s)"
+        )
+
+pd.DataFrame(summary).to_csv(RT_METRICS, index=False)
+pd.concat(centroids).to_csv(RT_CENTROIDS, index=False)
+print(f"Metrics saved to {RT_METRICS} and {RT_CENTROIDS}")
+
+# End the timer and calculate elapsed time
+end_time = time.time()
+elapsed_time = end_time - start_time
+
+# Convert elapsed time to minutes and seconds
+elapsed_minutes = int(elapsed_time // 60)
+elapsed_seconds = int(elapsed_time % 60)
+
+# Print total elapsed time in "minutes:seconds" format
+print(f"Finished in {elapsed_minutes}:{elapsed_seconds:02d} minutes.")